@@ -4,36 +4,234 @@
 
 
 import os
+import shutil
 import argparse
+import tempfile
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
+from fasta_reader import iter_fasta, accession, build_index, bgzip_file
+from decoy_generator import make_decoys, STRATEGIES
+from database_cache import cache_key, restore_database, store_database
 
-def prepare_database(input_db, input_neoORFs, output_db):
-    df = pd.read_csv(input_neoORFs, sep='\t', header=0)
-    df['header'] = df['key']
-    df['peptide'] = df['peptide.normal.ends'].str.replace('*', '', regex=False)
-    df = df[['header', 'peptide']].drop_duplicates()
-    neoORF_lines = ('>' + df['header'] + '\n' + df['peptide'] + '\n').tolist()
-    neoORF_rev_lines = ('>rev_' + df['header'] + '\n' + df['peptide'].map(lambda x: x[::-1]) + '\n').tolist()
+# reference FASTA is copied in blocks of this many bytes
+BLOCK_SIZE = 16 * 1024 * 1024
+# neoORF records are formatted and written this many at a time
+BATCH_SIZE = 100000
+# part of the cache key; bump it when a build from the same inputs and options gives a different database
+# (2: shuffle decoys seeded by global record index)
+DATABASE_VERSION = 2
+# the only neoORF table columns used
+NEOORF_COLUMNS = ['key', 'peptide.normal.ends']
 
-    lines = []
-    with open(input_db) as fh:
-        for line in fh:
-            lines.append(line)
+def read_neoORF_chunks(input_neoORFs, chunksize=500000):
+    # (header, peptide) chunks of one neoORF table, reading only the used columns
+    for chunk in pd.read_csv(input_neoORFs, sep='\t', header=0, usecols=NEOORF_COLUMNS, dtype=str, chunksize=chunksize):
+        chunk = chunk.dropna()
+        yield pd.DataFrame({'header': chunk['key'], 'peptide': chunk['peptide.normal.ends'].str.replace('*', '', regex=False)})
 
-    lines.extend(''.join(neoORF_lines))
-    lines.extend(''.join(neoORF_rev_lines))
+def stage_neoORFs(input_neoORFs, part_path, chunksize=500000):
+    # worker: write the (header, peptide) columns of one table to a part file
+    with open(part_path, 'w') as fh:
+        for chunk in read_neoORF_chunks(input_neoORFs, chunksize):
+            chunk.to_csv(fh, sep='\t', header=False, index=False)
+    return part_path
 
-    with open(output_db, 'w') as fh:
-        fh.write(''.join(lines))
+def iter_neoORFs(neoORF_files, chunksize=500000, workers=1, tmp_dir=None):
+    """
+    Yield deduplicated (header, peptide) chunks from all neoORF tables, in file order.
+
+    With several workers the tables are parsed concurrently into temporary two-column part files
+    which are then streamed back. Duplicate (header, peptide) pairs are dropped across all files by
+    keeping the 64-bit hash of every pair already yielded in a sorted numpy array (8 bytes per unique pair).
+    """
+    if workers > 1 and len(neoORF_files) > 1:
+        parts = [os.path.join(tmp_dir, f"neoORFs_{i}.tsv") for i in range(len(neoORF_files))]
+        executor = ProcessPoolExecutor(max_workers=workers)
+        staged = executor.map(stage_neoORFs, neoORF_files, parts, [chunksize] * len(parts))
+        chunks = (pd.read_csv(part, sep='\t', header=None, names=['header', 'peptide'], dtype=str,
+                              keep_default_na=False, chunksize=chunksize) for part in staged)
+    else:
+        executor = None
+        chunks = (read_neoORF_chunks(path, chunksize) for path in neoORF_files)
+
+    seen = np.empty(0, dtype=np.uint64)
+    try:
+        for file_chunks in chunks:
+            for chunk in file_chunks:
+                pair_hashes = pd.util.hash_pandas_object(chunk[['header', 'peptide']], index=False)
+                new = ~pair_hashes.duplicated().to_numpy()
+                hashes = pair_hashes.to_numpy()
+                if len(seen):
+                    position = np.minimum(np.searchsorted(seen, hashes), len(seen) - 1)
+                    new &= seen[position] != hashes
+                # the new hashes are unique and not in seen, so inserting them keeps it sorted
+                added = np.sort(hashes[new])
+                seen = np.insert(seen, np.searchsorted(seen, added), added)
+                if new.any():
+                    yield chunk[new].reset_index(drop=True)
+    finally:
+        if executor:
+            executor.shutdown()
+
+def hash_sequences(sequences):
+    # 64-bit hash of every sequence, computed vectorized by pandas
+    return pd.util.hash_pandas_object(pd.Series(sequences), index=False).to_numpy()
+
+def reference_hashes(input_db):
+    hashes = []
+    batch = []
+    for header, sequence in iter_fasta(input_db):
+        if not accession(header).startswith('rev_'):
+            batch.append(sequence)
+        if len(batch) == BATCH_SIZE:
+            hashes.append(hash_sequences(batch))
+            batch = []
+    hashes.append(hash_sequences(batch))
+    return np.unique(np.concatenate(hashes))
+
+def deduplicate_neoORFs(df, input_db=None):
+    """
+    Collapse neoORFs with identical sequences into one record whose header joins the keys with ';'
+    and drop neoORFs whose sequence is already a target entry of the reference database.
+
+    Sequences are grouped by a 64-bit hash; if two different sequences ever share a hash the
+    grouping falls back to the sequences themselves. Returns the deduplicated frame and a report.
+    """
+    report = {'neoORF records': len(df)}
+    df = df.assign(hash=hash_sequences(df['peptide']))
+    if input_db is not None:
+        in_reference = np.isin(df['hash'].to_numpy(), reference_hashes(input_db))
+        report['identical to reference'] = int(in_reference.sum())
+        df = df[~in_reference]
+
+    key = df['hash']
+    if (df['peptide'] != df.groupby('hash')['peptide'].transform('first')).any():
+        key = df['peptide']
+    merged = df.groupby(key, sort=False).agg(header=('header', ';'.join), peptide=('peptide', 'first'))
+    report['merged duplicate sequences'] = len(df) - len(merged)
+    report['neoORF records written'] = len(merged)
+    return merged.reset_index(drop=True), report
+
+def write_records(out, headers, peptides, prefix=''):
+    for start in range(0, len(headers), BATCH_SIZE):
+        batch = '>' + prefix + headers[start:start + BATCH_SIZE] + '\n' + peptides[start:start + BATCH_SIZE] + '\n'
+        out.write(''.join(batch.tolist()).encode())
+
+def copy_reference(input_db, out):
+    # block copy; only the last byte is inspected so the appended records start on a new line
+    with open(input_db, 'rb') as fh:
+        shutil.copyfileobj(fh, out, BLOCK_SIZE)
+        if fh.tell():
+            fh.seek(-1, os.SEEK_END)
+            if fh.read(1) != b'\n':
+                out.write(b'\n')
+
+def reference_targets(input_db):
+    # (headers, sequences) batches of the target entries of the reference; existing rev_ decoys are skipped
+    headers, sequences = [], []
+    for header, sequence in iter_fasta(input_db):
+        if accession(header).startswith('rev_'):
+            continue
+        headers.append(header)
+        sequences.append(sequence)
+        if len(headers) == BATCH_SIZE:
+            yield pd.Series(headers), pd.Series(sequences)
+            headers, sequences = [], []
+    if headers:
+        yield pd.Series(headers), pd.Series(sequences)
+
+def prepare_database(input_db, input_neoORFs, output_db, dedup=False, decoy_strategy='reverse', decoy_reference=False,
+                     seed=0, workers=1, bgzip=False, chunksize=500000, cache_dir=None, cache_max_gb=50):
+    neoORF_files = [input_neoORFs] if isinstance(input_neoORFs, str) else list(input_neoORFs)
+    if cache_dir:
+        # workers and chunksize do not change the output, so they are not part of the key
+        options = {'dedup': dedup, 'decoy_strategy': decoy_strategy, 'decoy_reference': decoy_reference,
+                   'seed': seed, 'bgzip': bgzip, 'version': DATABASE_VERSION}
+        key = cache_key([input_db] + neoORF_files, options)
+        if restore_database(cache_dir, key, output_db):
+            print(f"Database restored from cache entry {key}")
+            return
+    for suffix in ['', '.fai', '.gzi']:
+        # an existing output may be a hardlink into the cache, so it is replaced rather than truncated
+        if os.path.exists(output_db + suffix):
+            os.remove(output_db + suffix)
+    tmp_dir = tempfile.mkdtemp(prefix='.prepare_database_', dir=os.path.dirname(os.path.abspath(output_db)))
+    try:
+        chunks = iter_neoORFs(neoORF_files, chunksize, workers, tmp_dir)
+        if dedup:
+            # merging identical sequences needs every (header, peptide) pair at once
+            df, report = deduplicate_neoORFs(pd.concat(list(chunks), ignore_index=True), input_db)
+            for key, value in report.items():
+                print(f"{key}: {value}")
+            chunks = [df]
+        write_database(input_db, chunks, output_db, decoy_strategy, decoy_reference, seed, workers, bgzip, tmp_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    if cache_dir:
+        store_database(cache_dir, key, output_db, int(cache_max_gb * 2 ** 30))
+
+def write_database(input_db, neoORF_chunks, output_db, decoy_strategy='reverse', decoy_reference=False, seed=0,
+                   workers=1, bgzip=False, tmp_dir=None):
+    # neoORF decoys are generated along with their targets and staged in a temporary file
+    # so that they can follow all targets in the output without keeping them in memory
+    decoy_path = os.path.join(tmp_dir, 'neoORF_decoys.fasta')
+    # with bgzip the plain database is written first, indexed and then compressed
+    plain_db = os.path.join(tmp_dir, 'database.fasta') if bgzip else output_db
+    # one process pool generates the decoys of every chunk and reference batch
+    with open(plain_db, 'wb', buffering=BLOCK_SIZE) as out, open(decoy_path, 'wb', buffering=BLOCK_SIZE) as decoy_out, \
+            (ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext()) as executor:
+        if decoy_reference:
+            # the decoys of the reference are regenerated, so only its targets are copied
+            for batch_headers, sequences in reference_targets(input_db):
+                write_records(out, batch_headers, sequences)
+        else:
+            copy_reference(input_db, out)
+
+        # decoys are numbered across all chunks and the reference, so a shuffle does not depend on the chunk size
+        offset = 0
+        for chunk in neoORF_chunks:
+            headers = chunk['header'].reset_index(drop=True)
+            peptides = chunk['peptide'].reset_index(drop=True)
+            write_records(out, headers, peptides)
+            decoys = make_decoys(peptides, decoy_strategy, seed, workers, offset=offset, executor=executor)
+            offset += len(peptides)
+            write_records(decoy_out, headers, pd.Series(decoys), prefix='rev_')
+
+        if decoy_reference:
+            for batch_headers, sequences in reference_targets(input_db):
+                decoys = make_decoys(sequences, decoy_strategy, seed, workers, offset=offset, executor=executor)
+                offset += len(sequences)
+                write_records(out, batch_headers, pd.Series(decoys), prefix='rev_')
+        decoy_out.close()
+        with open(decoy_path, 'rb') as fh:
+            shutil.copyfileobj(fh, out, BLOCK_SIZE)
+
+    if bgzip:
+        # .fai offsets refer to the uncompressed data, so the index of the plain file is valid for the BGZF file
+        build_index(plain_db, output_db + '.fai')
+        bgzip_file(plain_db, output_db)
 
 def main():
     parser = argparse.ArgumentParser(description="Prepares fragpipe workflow by adding the database path and variable modifications.")
     parser.add_argument("--input_db", type=str, required=True, help="Path to the input database file.")
-    parser.add_argument("--input_neoORFs", type=str, required=True, help="Path to the input neoORFs file.")
+    parser.add_argument("--input_neoORFs", type=str, required=True, nargs='+', help="Path to the input neoORFs file(s), e.g. one per patient.")
     parser.add_argument("--output_db", type=str, required=True, help="Path to save the output database file.")
+    parser.add_argument("--dedup", action="store_true", help="Merge neoORFs with identical sequences and drop those already in the reference.")
+    parser.add_argument("--decoy_strategy", type=str, default='reverse', choices=STRATEGIES, help="How rev_ decoy sequences are generated.")
+    parser.add_argument("--decoy_reference", action="store_true", help="Drop the decoys of the input database and regenerate decoys for all entries.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the shuffle decoy strategy.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to read the neoORF files and generate decoys.")
+    parser.add_argument("--bgzip", action="store_true", help="Write the database block-gzip compressed with .fai and .gzi indexes (e.g. --output_db db.fasta.gz).")
+    parser.add_argument("--chunksize", type=int, default=500000, help="Rows of a neoORF file read at a time.")
+    parser.add_argument("--cache_dir", type=str, default=None, help="Directory of previously built databases, keyed by the input files and build options.")
+    parser.add_argument("--cache_max_gb", type=float, default=50, help="Size cap of the cache directory; least recently used databases are evicted.")
 
     args = parser.parse_args()
-    prepare_database(args.input_db, args.input_neoORFs, args.output_db)
+    prepare_database(args.input_db, args.input_neoORFs, args.output_db, args.dedup, args.decoy_strategy,
+                     args.decoy_reference, args.seed, args.workers, args.bgzip, args.chunksize,
+                     args.cache_dir, args.cache_max_gb)
 
 if __name__ == "__main__":
     main()
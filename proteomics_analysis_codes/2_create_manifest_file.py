@@ -9,21 +9,70 @@ import argparse
 from glob import glob
 import numpy as np
 import pandas as pd
+from peptide_mapper import build_automaton
+from file_scanner import scan_files, read_listing, write_listing, ready_files
 
-def create_manifest(mzml_files, samples_file, output_file):
-    new_files = glob(mzml_files)
-
+def read_sample_ids(samples_file):
+    # one sample ID per line; blank lines and repeated IDs are ignored
     with open(samples_file, "r") as f:
-        lines = f.read().splitlines()
+        return list(dict.fromkeys(line.strip() for line in f if line.strip()))
+
+def match_samples(paths, sample_ids):
+    """
+    Assign every path the longest sample ID it contains, scanning each path once with an
+    Aho-Corasick automaton over all sample IDs.
+
+    Returns a dict of path -> (sample ID or None, status), status being 'matched', 'ambiguous' or 'unmatched'.
+    Equally long matches are resolved in favour of the one closest to the end of the path (the file name).
+    A path is ambiguous when it also contains another sample ID that is not part of a longer match.
+    """
+    automaton = build_automaton(sample_ids)
+    matches = {}
+    for path in paths:
+        hits = [(end - len(sample_id) + 1, end, sample_id) for end, sample_id in automaton.iter(path)] if sample_ids else []
+        if not hits:
+            matches[path] = (None, 'unmatched')
+            continue
+        # hits inside a longer hit (e.g. S1 within S10) are part of that ID, not separate matches
+        hits = [(s, e, hit) for s, e, hit in hits
+                if not any(s2 <= s and e <= e2 and e2 - s2 > e - s for s2, e2, _ in hits)]
+        sample_id = max(hits, key=lambda hit: (hit[1] - hit[0], hit[1]))[2]
+        ambiguous = any(other != sample_id for _, _, other in hits)
+        matches[path] = (sample_id, 'ambiguous' if ambiguous else 'matched')
+    return matches
 
-    sample_name_dict = {}
-    for file_name in new_files:
-        for line in lines:
-            if line.strip() in file_name:
-                sample_name_dict[file_name] = "sample_" + line.strip()
+def find_mzml_files(mzml_files=None, mzml_dirs=None, listing=None, pattern='*.mzML', workers=8, min_age=60,
+                    listing_out=None):
+    """
+    Return the mzML paths for the manifest, from a glob pattern, a parallel scan of directories or a precomputed listing.
+
+    Scanned and listed files that are empty or were modified in the last min_age seconds are skipped.
+    """
+    if mzml_files:
+        return glob(mzml_files)
+    files = read_listing(listing) if listing else scan_files(mzml_dirs, pattern, workers)
+    if listing_out:
+        write_listing(files, listing_out)
+    files, skipped = ready_files(files, min_age)
+    if len(skipped):
+        print(f"Skipping {len(skipped)} empty or still changing file(s), e.g. {skipped['path'].iloc[0]}")
+    return files['path'].tolist()
+
+def create_manifest(mzml_files, samples_file, output_file, report_file=None, mzml_dirs=None, listing=None,
+                    pattern='*.mzML', workers=8, min_age=60, listing_out=None):
+    new_files = find_mzml_files(mzml_files, mzml_dirs, listing, pattern, workers, min_age, listing_out)
+    matches = match_samples(new_files, read_sample_ids(samples_file))
 
     # Create a list of sample names corresponding to new_files
-    sample_name = [sample_name_dict.get(file, 'default_value') for file in new_files]
+    sample_name = ["sample_" + sample_id if sample_id else 'default_value' for sample_id, _ in (matches[file] for file in new_files)]
+
+    flagged = [(file, sample_id or '', status) for file, (sample_id, status) in matches.items() if status != 'matched']
+    for status in ['unmatched', 'ambiguous']:
+        files = [file for file, _, s in flagged if s == status]
+        if files:
+            print(f"{len(files)} {status} file(s), e.g. {files[0]}")
+    if report_file:
+        pd.DataFrame(flagged, columns=['path', 'sample', 'status']).to_csv(report_file, sep='\t', index=False)
 
     manifest = pd.DataFrame({'path': new_files, 'experiment name': sample_name})
     manifest['replicate name'] = np.nan
@@ -32,12 +81,22 @@ def create_manifest(mzml_files, samples_file, output_file):
 
 def main():
     parser = argparse.ArgumentParser(description="Create a manifest file from sample data.")
-    parser.add_argument("--mzml_files", type=str, required=True, help="Path to the mzML files (e.g., '/path/to/*.mzML').")
+    parser.add_argument("--mzml_files", type=str, default=None, help="Path to the mzML files (e.g., '/path/to/*.mzML').")
+    parser.add_argument("--mzml_dirs", type=str, nargs='+', default=None, help="Directories scanned recursively for mzML files instead of --mzml_files.")
+    parser.add_argument("--listing", type=str, default=None, help="Precomputed file listing (path, size, mtime per line) used instead of scanning.")
+    parser.add_argument("--pattern", type=str, default='*.mzML', help="File name pattern for --mzml_dirs.")
+    parser.add_argument("--workers", type=int, default=8, help="Number of directories scanned concurrently.")
+    parser.add_argument("--min_age", type=float, default=60, help="Skip files modified less than this many seconds ago.")
+    parser.add_argument("--listing_out", type=str, default=None, help="Path to save the scanned file listing for reuse with --listing.")
     parser.add_argument("--samples_file", type=str, required=True, help="Path to the samples.txt file.")
     parser.add_argument("--output_file", type=str, required=True, help="Path to save the output manifest file.")
+    parser.add_argument("--report_file", type=str, default=None, help="Path to save the unmatched and ambiguous files as TSV.")
 
     args = parser.parse_args()
-    create_manifest(args.mzml_files, args.samples_file, args.output_file)
+    if not (args.mzml_files or args.mzml_dirs or args.listing):
+        parser.error("one of --mzml_files, --mzml_dirs or --listing is required")
+    create_manifest(args.mzml_files, args.samples_file, args.output_file, args.report_file, args.mzml_dirs,
+                    args.listing, args.pattern, args.workers, args.min_age, args.listing_out)
 
 if __name__ == "__main__":
     main()
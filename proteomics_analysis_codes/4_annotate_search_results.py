@@ -7,77 +7,356 @@
 import os
 import argparse
 import pdb
+import json
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 import pickle as pkl
 from os.path import exists
 import numpy as np
 import pandas as pd
-from Bio import SeqIO
-from tools import get_mapped_proteins, get_prot
+from peptide_mapper import get_mapped_proteins
+from protein_db_cache import load_protein_db, load_peptide_index, save_peptide_index
+from stage_profiler import StageProfiler
 from tqdm import tqdm
 
-def process_files(samples_list, database_w_neoORFs, output_path, study_id):
-    column_converter = {'ion.tsv': 'Peptide Sequence'}
-    db = {}
-    mappings = {}
-    for record in SeqIO.parse(database_w_neoORFs, format='fasta'):
-        header = record.id
-        if not header.startswith('rev_'):
-            if header.startswith('ENSP'):
-                splits = header.split('|')
-                for index, key in enumerate(['Protein', 'Transcript', 'gene', 'Gene Name']):
-                    try:
-                        mappings[key].append(splits[index])
-                    except KeyError:
-                        mappings[key] = [splits[index]]
-            seq = str(record.seq)
-            db[header] = seq
-    df_mappings = pd.DataFrame(mappings)
-    mapping_dict = df_mappings.set_index('Gene')['Gene Name'].to_dict()
+FILE_TYPES = ['peptide.tsv', 'psm.tsv', 'ion.tsv']
+COLUMN_CONVERTER = {'ion.tsv': 'Peptide Sequence'}
+# lost information due to unusual header information
+DROP_COLUMNS = ['Protein', 'Protein ID', 'Entry Name', 'Gene', 'Protein Description', 'Mapped Genes', 'Mapped Proteins']
+PARTITION_COLUMNS = ['Study ID', 'Sample Name']
+# incremental mode bookkeeping, kept in --output_path
+STATE_FILE = 'annotation_state.json'
+PEPTIDE_STATE_FILE = 'annotation_peptides.pkl'
+PROFILE_FILE = 'annotation_profile.json'
 
+# explicit dtypes for the pyarrow parser so string columns are not re-inferred per sample
+COLUMN_DTYPES = {'Peptide': 'string', 'Peptide Sequence': 'string', 'Modified Peptide': 'string',
+                 'Modified Sequence': 'string', 'Assigned Modifications': 'string', 'Spectrum': 'string',
+                 'Spectrum File': 'string', 'Charge': 'int16'}
+
+def read_sample(sample, file_type, study_id, chunksize=None, engine=None, usecols=None):
+    path = os.path.join(sample, file_type)
+    if chunksize is not None:
+        # the pyarrow parser cannot read in chunks
+        engine = None
+    options = {'dtype': COLUMN_DTYPES} if engine == 'pyarrow' else {'low_memory': False}
+    if usecols is not None:
+        peptide_column = COLUMN_CONVERTER.get(file_type, 'Peptide')
+        header = pd.read_csv(path, sep='\t', header=0, nrows=0).columns
+        options['usecols'] = [c for c in header if c in usecols or c == peptide_column]
+    reader = pd.read_csv(path, sep='\t', header=0, engine=engine, chunksize=chunksize, **options)
+    for temp_df in ([reader] if chunksize is None else reader):
+        temp_df.insert(0, 'Sample Name', os.path.basename(sample))
+        temp_df.insert(0, 'Study ID', study_id)
+        temp_df.drop([c for c in DROP_COLUMNS if c in temp_df.columns], axis=1, inplace=True)
+        yield temp_df
+
+def load_sample(sample, file_type, study_id, engine=None, usecols=None):
+    return next(read_sample(sample, file_type, study_id, engine=engine, usecols=usecols))
+
+def load_samples(samples_list, file_type, study_id, workers=1, engine=None, usecols=None):
+    if workers <= 1:
+        return [load_sample(sample, file_type, study_id, engine, usecols) for sample in tqdm(samples_list)]
+    n = len(samples_list)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(tqdm(executor.map(load_sample, samples_list, [file_type] * n, [study_id] * n,
+                                      [engine] * n, [usecols] * n), total=n))
+
+def map_peptides(peptides, db, equate_il=False, cache_entry=None, known=None):
+    # only peptides without a known mapping (database cache / earlier incremental runs) are mapped
+    known = dict(known) if known else {}
+    if cache_entry:
+        known.update(load_peptide_index(cache_entry, equate_il))
+    prot_dict = get_mapped_proteins([p for p in peptides if p not in known], db, equate_il=equate_il)
+    if cache_entry:
+        save_peptide_index(cache_entry, prot_dict, equate_il)
+    prot_dict.update(known)
+    return prot_dict
+
+def collect_matches(rows, codes, proteins, pattern):
+    # (row, match) pairs for every regex match in the proteins mapped to each row, deduplicated
+    matches = proteins.str.findall(pattern).explode().dropna()
+    matches = pd.DataFrame({'code': matches.index, 'value': matches.to_numpy()})
+    pairs = pd.DataFrame({'row': rows, 'code': codes}).merge(matches, on='code')
+    return pairs.drop_duplicates(['row', 'value'])
+
+def join_values(pairs):
+    return pairs.groupby('row', sort=False)['value'].agg(', '.join)
+
+def annotate_peptides(peptides, prot_dict, mapping_dict, peptide_column='Peptide'):
+    sdf = pd.DataFrame({peptide_column: peptides})
+    sdf['Mapped Proteins'] = sdf[peptide_column].map(prot_dict).fillna('')
+
+    # explode the peptide -> protein relation once; every protein-level property is computed
+    # on the distinct proteins (categories) and broadcast back through the category codes
+    long = sdf['Mapped Proteins'].str.split(', ').explode()
+    categorical = pd.Categorical(long)
+    proteins = pd.Series(categorical.categories)
+    codes = categorical.codes
+    rows = long.index.to_numpy()
+
+    is_contaminant = proteins.str.startswith('sp').to_numpy()[codes]
+    is_trans = proteins.str.startswith(("taa", "trans")).to_numpy()[codes]
+    contaminant = pd.Series(is_contaminant, index=rows).groupby(level=0).any()
+    trans = pd.Series(is_trans, index=rows).groupby(level=0).all()
+
+    # add Transcript and Gene information
+    transcripts = collect_matches(rows, codes, proteins, 'ENST[0-9]+')
+    genes = collect_matches(rows, codes, proteins, 'ENSG[0-9]+')
+    gene_names = genes.assign(value=genes['value'].map(mapping_dict).fillna('')).drop_duplicates(['row', 'value'])
+    sdf['Mapped Transcripts'] = join_values(transcripts)
+    sdf['Mapped Genes'] = join_values(genes)
+    sdf['Mapped Genes'] = sdf['Mapped Genes'].fillna('')
+    sdf['Mapped Gene Names'] = join_values(gene_names)
+    sdf['Mapped Gene Names'] = sdf['Mapped Gene Names'].fillna('')
+    sdf['Peptide Type'] = np.where(trans, 'trans peptide', 'regular peptide')
+
+    # remove contaminants
+    return sdf[~contaminant.to_numpy()]
+
+def build_annotation_table(peptides, prot_dict, mapping_dict):
+    # one row per unique peptide shared by all file types; the row number is the peptide code
+    sdf = annotate_peptides(peptides, prot_dict, mapping_dict).reset_index(drop=True)
+    annotation_columns = [c for c in sdf.columns if c != 'Peptide']
+    return sdf.astype({c: 'category' for c in annotation_columns})
+
+def join_annotation(df_type, sdf, peptide_column, group_by_peptide=False):
+    # rows of peptides missing from the table (contaminants) are dropped, as with merge(how='right')
+    if group_by_peptide:
+        # same row order as merge(how='right'): grouped by peptide in order of first appearance
+        df_type = df_type.iloc[np.argsort(pd.factorize(df_type[peptide_column])[0], kind='stable')]
+    codes = pd.Index(sdf['Peptide']).get_indexer(df_type[peptide_column])
+    keep = codes >= 0
+    annotation = sdf.drop(columns='Peptide').take(codes[keep]).reset_index(drop=True)
+    return pd.concat([df_type[keep].reset_index(drop=True), annotation], axis=1)
+
+def write_output(df_type, output_path, file_type, output_format='tsv', append=False):
+    if output_format == 'tsv':
+        if append and os.path.exists(os.path.join(output_path, file_type)):
+            # keep the column layout of the file being appended to
+            df_type = df_type.reindex(columns=pd.read_csv(os.path.join(output_path, file_type), sep='\t', nrows=0).columns)
+        df_type.to_csv(os.path.join(output_path, file_type), sep='\t', header=not append, index=False,
+                       mode='a' if append else 'w')
+        return
+
+    import pyarrow.parquet as pq
+    # <output_path>/<peptide|psm|ion>/Study ID=<id>/Sample Name=<name>/*.parquet
+    dataset_path = os.path.join(output_path, os.path.splitext(file_type)[0])
+    if not append and os.path.exists(dataset_path):
+        shutil.rmtree(dataset_path)
+    # every chunk and run is written with the schema of the first one, so the files of a dataset can be read together
+    schema = (read_parquet_schema(dataset_path) if append else None) or parquet_schema(df_type)
+    pq.write_to_dataset(parquet_table(df_type, schema), dataset_path, partition_cols=PARTITION_COLUMNS,
+                        compression='zstd', use_dictionary=True, existing_data_behavior='overwrite_or_ignore')
+
+def parquet_schema(df_type):
+    # repetitive text columns are stored dictionary encoded; a column without any value is taken as text,
+    # as pandas reads an empty column (e.g. Assigned Modifications) as float
+    import pyarrow as pa
+    fields = []
+    for column in df_type.columns:
+        values = df_type[column]
+        if (column in PARTITION_COLUMNS or values.isna().all() or values.dtype == object
+                or isinstance(values.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(values)):
+            fields.append(pa.field(column, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(pa.field(column, pa.Schema.from_pandas(values.to_frame(), preserve_index=False).field(0).type))
+    return pa.schema(fields)
+
+def read_parquet_schema(dataset_path):
+    # schema of the files already written (partition columns are only stored in the directory names)
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    for directory, _, files in sorted(os.walk(dataset_path)):
+        for name in sorted(files):
+            if name.endswith('.parquet'):
+                schema = pq.read_schema(os.path.join(directory, name))
+                # dictionary indices are widened, a later chunk may have more distinct values
+                fields = [pa.field(field.name, pa.dictionary(pa.int32(), field.type.value_type))
+                          if pa.types.is_dictionary(field.type) else field for field in schema]
+                partition_fields = [pa.field(column, pa.dictionary(pa.int32(), pa.string())) for column in PARTITION_COLUMNS]
+                return pa.schema(partition_fields + fields)
+    return None
+
+def parquet_table(df_type, schema):
+    # columns are cast to the schema; columns missing from the chunk or empty in it are written as nulls
+    import pyarrow as pa
+    columns = []
+    for field in schema:
+        values = df_type[field.name] if field.name in df_type.columns else None
+        if values is None or values.isna().all():
+            columns.append(pa.nulls(len(df_type), field.type))
+            continue
+        column = pa.array(values, from_pandas=True)
+        if pa.types.is_dictionary(field.type):
+            if pa.types.is_dictionary(column.type):
+                column = column.dictionary_decode()
+            column = column.cast(pa.string()).dictionary_encode()
+        columns.append(column.cast(field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+def read_output(output_path, file_type, study_id=None, sample_name=None):
+    # only the matching Study ID / Sample Name partitions are read from a parquet output
+    import pyarrow.parquet as pq
+    filters = [(column, '==', value) for column, value in zip(PARTITION_COLUMNS, [study_id, sample_name]) if value is not None]
+    dataset_path = os.path.join(output_path, os.path.splitext(file_type)[0])
+    return pq.read_table(dataset_path, filters=filters or None).to_pandas()
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def sample_fingerprint(sample):
+    return {file_type: file_fingerprint(os.path.join(sample, file_type)) for file_type in FILE_TYPES}
+
+def load_state(output_path):
+    state_file = os.path.join(output_path, STATE_FILE)
+    if not os.path.exists(state_file):
+        return None, {}
+    with open(state_file) as fh:
+        state = json.load(fh)
+    with open(os.path.join(output_path, PEPTIDE_STATE_FILE), 'rb') as fh:
+        known = pkl.load(fh)
+    return state, known
+
+def save_state(output_path, state, prot_dict):
+    with open(os.path.join(output_path, PEPTIDE_STATE_FILE), 'wb') as fh:
+        pkl.dump(prot_dict, fh, protocol=pkl.HIGHEST_PROTOCOL)
+    with open(os.path.join(output_path, STATE_FILE), 'w') as fh:
+        json.dump(state, fh, indent=2)
+
+def plan_incremental(samples_list, output_path, settings):
+    """
+    Return (samples to process, known peptide mappings, previously processed samples).
+
+    Only samples missing from the state file are processed. A full run is planned when there is
+    no state yet, the run settings differ or an already processed sample has changed on disk.
+    """
+    state, known = load_state(output_path)
+    if state is None:
+        return samples_list, {}, {}
+    if state['settings'] != settings:
+        print('Settings changed since the last run, re-annotating all samples')
+        return samples_list, {}, {}
+    processed = state['samples']
+    changed = [sample for sample in samples_list
+               if os.path.abspath(sample) in processed and processed[os.path.abspath(sample)] != sample_fingerprint(sample)]
+    if changed:
+        print(f"{len(changed)} processed samples changed since the last run, re-annotating all samples")
+        return samples_list, {}, {}
+    new_samples = [sample for sample in samples_list if os.path.abspath(sample) not in processed]
+    print(f"{len(new_samples)} new samples, {len(samples_list) - len(new_samples)} already annotated")
+    return new_samples, known, processed
+
+def process_files(samples_list, database_w_neoORFs, output_path, study_id, equate_il=False, cache_dir=None,
+                  streaming=False, chunksize=200000, workers=1, engine=None, usecols=None, output_format='tsv',
+                  incremental=False, profile=False, profile_mapping=False):
+    profiler = StageProfiler(profile, ['mapping'] if profile_mapping else [], output_path)
+    known, processed, append = {}, {}, False
+    if incremental:
+        settings = {'database': [os.path.abspath(database_w_neoORFs)] + file_fingerprint(database_w_neoORFs),
+                    'study_id': study_id, 'equate_il': equate_il, 'usecols': usecols, 'output_format': output_format}
+        samples_list, known, processed = plan_incremental(samples_list, output_path, settings)
+        append = bool(processed)
+        if not samples_list:
+            print('Nothing to annotate')
+            return
+
+    with profiler.stage('fasta_parse') as record:
+        db, mapping_dict, cache_entry = load_protein_db(database_w_neoORFs, cache_dir)
+        record['rows'] = len(db)
+    if streaming:
+        prot_dict = process_files_streaming(samples_list, db, mapping_dict, cache_entry, output_path, study_id,
+                                            equate_il, chunksize, usecols, output_format, known, append, profiler)
+    else:
+        prot_dict = process_files_in_memory(samples_list, db, mapping_dict, cache_entry, output_path, study_id,
+                                            equate_il, workers, engine, usecols, output_format, known, append, profiler)
+
+    if incremental:
+        processed.update({os.path.abspath(sample): sample_fingerprint(sample) for sample in samples_list})
+        save_state(output_path, {'settings': settings, 'samples': processed}, prot_dict)
+    profiler.write(os.path.join(output_path, PROFILE_FILE), study_id=study_id, samples=len(samples_list),
+                   streaming=streaming, workers=workers, engine=engine, output_format=output_format)
+
+def process_files_in_memory(samples_list, db, mapping_dict, cache_entry, output_path, study_id, equate_il=False,
+                            workers=1, engine=None, usecols=None, output_format='tsv', known=None, append=False,
+                            profiler=None):
+    profiler = profiler or StageProfiler()
     print('processing files')
-    file_types = ['peptide.tsv', 'psm.tsv', 'ion.tsv']
     df = {}
-    for file_type in file_types:
+    for file_type in FILE_TYPES:
         print(f"processing {file_type}")
-        df_list = []
-        peptide_column = column_converter.get(file_type, 'Peptide')
-        for sample in tqdm(samples_list):
-            temp_df = pd.read_csv(os.path.join(sample, file_type), sep='\t', header=0, low_memory=False)
-            temp_df.insert(0, 'Sample Name', os.path.basename(sample))
-            temp_df.insert(0, 'Study ID', study_id)
-            # lost information due to unusual header information
-            temp_df.drop(['Protein', 'Protein ID', 'Entry Name', 'Gene', 'Protein Description', 'Mapped Genes', 'Mapped Proteins'],
-                         axis=1, inplace=True)
-            df_list.append(temp_df)
-        df[file_type] = pd.concat(df_list)
+        with profiler.stage('tsv_load', file_type) as record:
+            df[file_type] = pd.concat(load_samples(samples_list, file_type, study_id, workers, engine, usecols))
+            record['rows'] = len(df[file_type])
 
     print('Getting mapped proteins information')
-    peptides = []
-    peptides.extend(list(df['peptide.tsv'].Peptide.unique()))
-    peptides.extend(list(df['psm.tsv'].Peptide.unique()))
-    peptides.extend(list(df['ion.tsv']['Peptide Sequence'].unique()))
-    peptides = list(set(peptides))
-    prot_dict = get_mapped_proteins(peptides, db)
+    peptides = set()
+    for file_type, df_type in df.items():
+        peptides.update(df_type[COLUMN_CONVERTER.get(file_type, 'Peptide')].unique())
+    with profiler.stage('mapping') as record:
+        prot_dict = map_peptides(list(peptides), db, equate_il, cache_entry, known)
+        record['rows'] = len(peptides)
+    sdf = profiler.run('annotation_table', build_annotation_table, sorted(peptides), prot_dict, mapping_dict)
 
     for file_type, df_type in df.items():
-        peptide_column = column_converter.get(file_type, 'Peptide')
-        sdf = pd.DataFrame({peptide_column: df_type[peptide_column].unique()})
-        sdf['Mapped Proteins'] = sdf[peptide_column].map(prot_dict)
-        # remove contaminants
-        sdf = sdf[~sdf['Mapped Proteins'].map(lambda x: any([y.startswith('sp') for y in x.split(', ')]))]
-        # add Transcript and Gene information
-        sdf['Mapped Transcripts'] = sdf['Mapped Proteins'].str.extractall('(ENST[0-9]+)').reset_index().groupby('level_0').agg({0: lambda x: ', '.join(set(x))})
-        sdf['Mapped Genes'] = sdf['Mapped Proteins'].str.extractall('(ENSG[0-9]+)').reset_index().groupby('level_0').agg({0: lambda x: ', '.join(set(x))})
-        sdf['Mapped Genes'] = sdf['Mapped Genes'].fillna('')
-        sdf['Mapped Gene Names'] = sdf['Mapped Genes'].map(lambda x: ', '.join(set([mapping_dict.get(y, '') for y in x.split(', ')])))
-        sdf['Peptide Type'] = sdf['Mapped Proteins'].map(lambda x: all([y.startswith(("taa", "trans")) for y in x.split(', ')]))
-        sdf['Peptide Type'] = sdf['Peptide Type'].map({True: 'trans peptide', False: 'regular peptide'})
-        df_type = df_type.merge(sdf, how='right')
-        df[file_type] = df_type
-
-    df['peptide.tsv'].to_csv(os.path.join(output_path, 'peptide.tsv'), sep='\t', header=True, index=False)
-    df['psm.tsv'].to_csv(os.path.join(output_path, 'psm.tsv'), sep='\t', header=True, index=False)
-    df['ion.tsv'].to_csv(os.path.join(output_path, 'ion.tsv'), sep='\t', header=True, index=False)
+        df_type = df_type.astype({c: 'category' for c in PARTITION_COLUMNS})
+        df[file_type] = profiler.run('annotation_join', join_annotation, df_type, sdf,
+                                     COLUMN_CONVERTER.get(file_type, 'Peptide'), group_by_peptide=True, file_type=file_type)
+
+    for file_type in FILE_TYPES:
+        with profiler.stage('write', file_type) as record:
+            write_output(df[file_type], output_path, file_type, output_format, append)
+            record['rows'] = len(df[file_type])
+    return prot_dict
+
+def process_files_streaming(samples_list, db, mapping_dict, cache_entry, output_path, study_id, equate_il=False,
+                            chunksize=200000, usecols=None, output_format='tsv', known=None, append=False,
+                            profiler=None):
+    # Two passes so that only one chunk of one sample is held in memory at a time:
+    # 1) read the peptide column (and the header) of every file to collect the unique peptides
+    # 2) annotate each chunk and append it to the output file
+    profiler = profiler or StageProfiler()
+    print('collecting peptides')
+    peptides = set()
+    columns = {}
+    for file_type in FILE_TYPES:
+        print(f"scanning {file_type}")
+        peptide_column = COLUMN_CONVERTER.get(file_type, 'Peptide')
+        columns[file_type] = []
+        with profiler.stage('peptide_scan', file_type) as record:
+            rows = 0
+            for sample in tqdm(samples_list):
+                path = os.path.join(sample, file_type)
+                header = pd.read_csv(path, sep='\t', header=0, nrows=0).columns
+                columns[file_type].extend(c for c in header if c not in columns[file_type] and (usecols is None or c in usecols or c == peptide_column))
+                sample_peptides = pd.read_csv(path, sep='\t', header=0, usecols=[peptide_column])[peptide_column]
+                peptides.update(sample_peptides.unique())
+                rows += len(sample_peptides)
+            record['rows'] = rows
+
+    print('Getting mapped proteins information')
+    with profiler.stage('mapping') as record:
+        prot_dict = map_peptides(list(peptides), db, equate_il, cache_entry, known)
+        record['rows'] = len(peptides)
+    sdf = profiler.run('annotation_table', build_annotation_table, sorted(peptides), prot_dict, mapping_dict)
+
+    for file_type in FILE_TYPES:
+        print(f"annotating {file_type}")
+        peptide_column = COLUMN_CONVERTER.get(file_type, 'Peptide')
+        # same column layout as the concatenated frame in the in-memory mode
+        out_columns = ['Study ID', 'Sample Name'] + [c for c in columns[file_type] if c not in DROP_COLUMNS]
+        type_append = append
+        with profiler.stage('load_annotate_write', file_type) as record:
+            rows = 0
+            for sample in tqdm(samples_list):
+                for temp_df in read_sample(sample, file_type, study_id, chunksize, usecols=usecols):
+                    temp_df = join_annotation(temp_df.reindex(columns=out_columns), sdf, peptide_column)
+                    write_output(temp_df, output_path, file_type, output_format, type_append)
+                    type_append = True
+                    rows += len(temp_df)
+            record['rows'] = rows
+    return prot_dict
 
 def main():
     parser = argparse.ArgumentParser(description="Process files and generate output.")
@@ -85,9 +364,22 @@ def main():
     parser.add_argument("--database_w_neoORFs", type=str, required=True, help="Path to the database with neoORFs.")
     parser.add_argument("--output_path", type=str, required=True, help="Path to save the output files.")
     parser.add_argument("--study_id", type=str, required=True, help="Study ID to insert into the files.")
+    parser.add_argument("--equate_il", action="store_true", help="Treat isoleucine and leucine as identical when mapping peptides to proteins.")
+    parser.add_argument("--cache_dir", type=str, default=None, help="Directory for the parsed database cache (reused across runs sharing a database).")
+    parser.add_argument("--streaming", action="store_true", help="Annotate and write one sample chunk at a time to bound memory usage.")
+    parser.add_argument("--chunksize", type=int, default=200000, help="Rows per chunk in streaming mode.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to load the sample files.")
+    parser.add_argument("--engine", type=str, default=None, choices=['c', 'python', 'pyarrow'], help="pandas CSV parser engine (pyarrow is multithreaded; not used for streaming chunks).")
+    parser.add_argument("--usecols", type=str, nargs='+', default=None, help="Subset of columns to load from the sample files (the peptide column is always kept).")
+    parser.add_argument("--output_format", type=str, default='tsv', choices=['tsv', 'parquet'], help="Write flat TSVs or parquet datasets partitioned by Study ID and Sample Name.")
+    parser.add_argument("--incremental", action="store_true", help="Only annotate samples not recorded in the state file of --output_path and append them to the outputs.")
+    parser.add_argument("--profile", action="store_true", help="Write per-stage wall/CPU time, peak memory and row counts to annotation_profile.json in --output_path.")
+    parser.add_argument("--profile_mapping", action="store_true", help="Dump a cProfile of the peptide mapping stage to mapping.prof in --output_path.")
 
     args = parser.parse_args()
-    process_files(args.samples_list, args.database_w_neoORFs, args.output_path, args.study_id)
+    process_files(args.samples_list, args.database_w_neoORFs, args.output_path, args.study_id, args.equate_il, args.cache_dir,
+                  args.streaming, args.chunksize, args.workers, args.engine, args.usecols,
+                  args.output_format, args.incremental, args.profile, args.profile_mapping)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+
+#Code to benchmark the search result annotation pipeline (4_annotate_search_results.py) on synthetic data.
+#A FragPipe-like study (peptide.tsv, psm.tsv, ion.tsv per sample) and an ENSP/neoORF search database
+#are generated offline at the requested scale, then every stage is timed and the peak RSS recorded.
+#Results are written as JSON so runs from different commits can be compared.
+
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import importlib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+annotate = importlib.import_module('4_annotate_search_results')
+from peptide_mapper import get_mapped_proteins
+from protein_db_cache import read_protein_db
+from stage_profiler import StageProfiler
+
+AMINO_ACIDS = np.frombuffer(b'ACDEFGHIKLMNPQRSTVWY', dtype=np.uint8)
+PROTEIN_COLUMNS = ['Protein', 'Protein ID', 'Entry Name', 'Gene', 'Protein Description', 'Mapped Genes', 'Mapped Proteins']
+
+
+def random_sequences(rng, n, min_length, max_length):
+    lengths = rng.integers(min_length, max_length + 1, size=n)
+    residues = AMINO_ACIDS[rng.integers(0, len(AMINO_ACIDS), size=lengths.sum())].tobytes().decode()
+    ends = np.cumsum(lengths)
+    return [residues[end - length:end] for end, length in zip(ends, lengths)]
+
+
+def write_database(path, rng, n_proteins, n_neoorfs, n_contaminants, protein_length):
+    headers = [f"ENSP{i:011d}|ENST{i:011d}|ENSG{i // 3:011d}|GENE{i // 3}" for i in range(n_proteins)]
+    headers += [f"trans_{i}" for i in range(n_neoorfs)]
+    headers += [f"sp|CONT{i:05d}|CONT{i}_HUMAN" for i in range(n_contaminants)]
+    sequences = random_sequences(rng, n_proteins, protein_length // 2, protein_length * 3 // 2)
+    sequences += random_sequences(rng, n_neoorfs + n_contaminants, 20, 120)
+    with open(path, 'w') as fh:
+        for header, sequence in zip(headers, sequences):
+            fh.write(f">{header}\n{sequence}\n")
+        for header, sequence in zip(headers, sequences):
+            fh.write(f">rev_{header}\n{sequence[::-1]}\n")
+    return sequences
+
+
+def sample_peptides(rng, sequences, n):
+    proteins = rng.integers(0, len(sequences), size=n)
+    lengths = rng.integers(8, 16, size=n)
+    peptides = []
+    for protein, length in zip(proteins, lengths):
+        sequence = sequences[protein]
+        length = min(length, len(sequence))
+        start = rng.integers(0, len(sequence) - length + 1)
+        peptides.append(sequence[start:start + length])
+    return peptides
+
+
+def write_sample(sample_dir, rng, peptides, psms_per_peptide):
+    os.makedirs(sample_dir, exist_ok=True)
+    protein_values = {column: 'synthetic' for column in PROTEIN_COLUMNS}
+    n = len(peptides)
+    pd.DataFrame({'Peptide': peptides, 'Peptide Length': [len(p) for p in peptides],
+                  'Charges': '2', 'Probability': rng.random(n), 'Spectral Count': psms_per_peptide,
+                  'Intensity': rng.random(n) * 1e6, 'Assigned Modifications': '', **protein_values}
+                 ).to_csv(os.path.join(sample_dir, 'peptide.tsv'), sep='\t', index=False)
+
+    psm_peptides = np.repeat(peptides, psms_per_peptide)
+    m = len(psm_peptides)
+    spectrum_file = os.path.basename(sample_dir) + '.mzML'
+    pd.DataFrame({'Spectrum': [f"{spectrum_file}.{i}.{i}.2" for i in range(m)], 'Spectrum File': spectrum_file,
+                  'Peptide': psm_peptides, 'Modified Peptide': '', 'Charge': rng.integers(1, 5, size=m),
+                  'Retention': rng.random(m) * 3600, 'Hyperscore': rng.random(m) * 40, 'Probability': rng.random(m),
+                  'Intensity': rng.random(m) * 1e6, **protein_values}
+                 ).to_csv(os.path.join(sample_dir, 'psm.tsv'), sep='\t', index=False)
+    pd.DataFrame({'Peptide Sequence': psm_peptides, 'Modified Sequence': psm_peptides,
+                  'Charge': rng.integers(1, 5, size=m), 'M/Z': rng.random(m) * 1500, 'Intensity': rng.random(m) * 1e6,
+                  **protein_values}
+                 ).to_csv(os.path.join(sample_dir, 'ion.tsv'), sep='\t', index=False)
+
+
+def generate_study(workdir, n_proteins, n_neoorfs, n_contaminants, protein_length, n_samples, peptides_per_sample,
+                   psms_per_peptide, seed=0):
+    rng = np.random.default_rng(seed)
+    database = os.path.join(workdir, 'database_w_neoORFs.fasta')
+    sequences = write_database(database, rng, n_proteins, n_neoorfs, n_contaminants, protein_length)
+    samples_list = []
+    for i in range(n_samples):
+        sample_dir = os.path.join(workdir, f"sample_{i:04d}")
+        write_sample(sample_dir, rng, sample_peptides(rng, sequences, peptides_per_sample), psms_per_peptide)
+        samples_list.append(sample_dir)
+    return database, samples_list
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(database, samples_list, output_path, equate_il=False, workers=1, engine=None, output_format='tsv'):
+    profiler = StageProfiler(enabled=True)
+    db, mapping_dict = profiler.run('fasta_parse', read_protein_db, database)
+
+    df = {}
+    for file_type in annotate.FILE_TYPES:
+        df[file_type] = profiler.run('tsv_load', lambda: pd.concat(
+            annotate.load_samples(samples_list, file_type, 'BENCH', workers, engine)), file_type=file_type)
+
+    peptides = set()
+    for file_type, df_type in df.items():
+        peptides.update(df_type[annotate.COLUMN_CONVERTER.get(file_type, 'Peptide')].unique())
+    prot_dict = profiler.run('mapping', get_mapped_proteins, list(peptides), db, equate_il=equate_il)
+
+    sdf = profiler.run('annotation_table', annotate.build_annotation_table, sorted(peptides), prot_dict, mapping_dict)
+    for file_type in annotate.FILE_TYPES:
+        peptide_column = annotate.COLUMN_CONVERTER.get(file_type, 'Peptide')
+        df[file_type] = profiler.run('annotation_join', annotate.join_annotation,
+                                     df[file_type].astype({c: 'category' for c in annotate.PARTITION_COLUMNS}),
+                                     sdf, peptide_column, group_by_peptide=True, file_type=file_type)
+
+    for file_type in annotate.FILE_TYPES:
+        with profiler.stage('write', file_type) as record:
+            annotate.write_output(df[file_type], output_path, file_type, output_format)
+            record['rows'] = len(df[file_type])
+
+    counts = {'proteins': len(db), 'unique_peptides': len(peptides)}
+    return profiler, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search result annotation on a synthetic study.")
+    parser.add_argument("--output_json", type=str, required=True, help="Path to save the benchmark results.")
+    parser.add_argument("--workdir", type=str, default=None, help="Directory for the synthetic data (temporary by default).")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic data and outputs.")
+    parser.add_argument("--n_proteins", type=int, default=20000, help="Number of ENSP proteins in the database.")
+    parser.add_argument("--protein_length", type=int, default=550, help="Mean protein length.")
+    parser.add_argument("--n_neoorfs", type=int, default=20000, help="Number of neoORF entries in the database.")
+    parser.add_argument("--n_contaminants", type=int, default=100, help="Number of sp| contaminant entries.")
+    parser.add_argument("--n_samples", type=int, default=10, help="Number of sample directories.")
+    parser.add_argument("--peptides_per_sample", type=int, default=5000, help="Peptides per sample.")
+    parser.add_argument("--psms_per_peptide", type=int, default=3, help="PSM/ion rows per peptide.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument("--equate_il", action="store_true", help="Treat isoleucine and leucine as identical when mapping.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to load the sample files.")
+    parser.add_argument("--engine", type=str, default=None, choices=['c', 'python', 'pyarrow'], help="pandas CSV parser engine.")
+    parser.add_argument("--output_format", type=str, default='tsv', choices=['tsv', 'parquet'], help="Output format to benchmark.")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='annotation_benchmark_')
+    os.makedirs(workdir, exist_ok=True)
+    output_path = os.path.join(workdir, 'output')
+    os.makedirs(output_path, exist_ok=True)
+    try:
+        print(f"Generating synthetic study in {workdir}")
+        generation_start = time.perf_counter()
+        database, samples_list = generate_study(workdir, args.n_proteins, args.n_neoorfs, args.n_contaminants,
+                                                args.protein_length, args.n_samples, args.peptides_per_sample,
+                                                args.psms_per_peptide, args.seed)
+        generation_s = round(time.perf_counter() - generation_start, 4)
+
+        profiler, counts = run_benchmark(database, samples_list, output_path, args.equate_il, args.workers,
+                                       args.engine, args.output_format)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    params = {k: v for k, v in vars(args).items() if k not in ('output_json', 'workdir', 'keep')}
+    profiler.write(args.output_json, commit=git_commit(), timestamp=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   python=platform.python_version(), pandas=pd.__version__, params=params,
+                   generation_s=generation_s, counts=counts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+#Code to keep built search databases in a content-addressed cache directory.
+#An entry is keyed by the SHA1 of every input file plus the build options and holds the database
+#and its .fai/.gzi indexes. Hits are hardlinked (or copied across filesystems) to the requested output.
+#The cache is capped in size; entries are evicted least recently used first (entry mtime is the last use).
+
+
+import os
+import json
+import shutil
+import hashlib
+from protein_db_cache import file_key
+
+# files of an entry, stored as database<suffix> and restored as <output_db><suffix>
+SUFFIXES = ['', '.fai', '.gzi']
+
+
+def cache_key(input_files, options):
+    sha1 = hashlib.sha1()
+    for path in input_files:
+        sha1.update(file_key(path).encode())
+    sha1.update(json.dumps(options, sort_keys=True).encode())
+    return sha1.hexdigest()
+
+
+def _link_or_copy(src, dst):
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _entry_size(entry_dir):
+    return sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+
+
+def restore_database(cache_dir, key, output_db):
+    """Place a cached database at output_db. Returns False on a cache miss."""
+    entry_dir = os.path.join(cache_dir, key)
+    if not os.path.isdir(entry_dir):
+        return False
+    # indexes of an earlier build at output_db must not be left next to a database without them
+    for suffix in SUFFIXES:
+        if os.path.lexists(output_db + suffix):
+            os.remove(output_db + suffix)
+    for suffix in SUFFIXES:
+        cached = os.path.join(entry_dir, 'database' + suffix)
+        if os.path.exists(cached):
+            _link_or_copy(cached, output_db + suffix)
+    os.utime(entry_dir)
+    return True
+
+
+def store_database(cache_dir, key, output_db, max_bytes):
+    """Add a freshly built database to the cache and evict entries beyond max_bytes."""
+    os.makedirs(cache_dir, exist_ok=True)
+    entry_dir = os.path.join(cache_dir, key)
+    tmp_dir = f"{entry_dir}.tmp{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    for suffix in SUFFIXES:
+        if os.path.exists(output_db + suffix):
+            _link_or_copy(output_db + suffix, os.path.join(tmp_dir, 'database' + suffix))
+    try:
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        # another build stored the same entry first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    evict(cache_dir, max_bytes, keep=key)
+
+
+def evict(cache_dir, max_bytes, keep=None):
+    """Remove least recently used entries until the cache is at most max_bytes."""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_dir() and '.tmp' not in entry.name:
+            entries.append((entry.stat().st_mtime, entry.name, _entry_size(entry.path)))
+    total = sum(size for _, _, size in entries)
+    for _, name, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if name == keep:
+            continue
+        print(f"Evicting cached database {name}")
+        shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+        total -= size
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+#Code to generate decoy sequences for a search database.
+#All sequences of a chunk are concatenated into one numpy byte array and rearranged with a single
+#index permutation, so no per-sequence python work is done apart from splitting the result.
+#Strategies:
+#  reverse        - reverse the whole sequence
+#  pseudo_reverse - reverse every cleavage segment but keep its C-terminal cleavage residue (K/R) in place
+#  shuffle        - seeded shuffle of every cleavage segment, keeping the cleavage residue in place
+#The shuffle of a sequence depends only on the seed and its index in the whole input, not on how it is chunked.
+
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+STRATEGIES = ['reverse', 'pseudo_reverse', 'shuffle']
+# sequences are spread evenly over the workers, but a chunk holds at least this many
+MIN_CHUNK_SIZE = 10000
+
+
+def _concatenate(sequences):
+    lengths = np.fromiter((len(s) for s in sequences), dtype=np.int64, count=len(sequences))
+    residues = np.frombuffer(''.join(sequences).encode('ascii'), dtype=np.uint8)
+    starts = np.zeros(len(sequences) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=starts[1:])
+    return residues, starts
+
+
+def _mix(h):
+    # splitmix64 finalizer
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return h ^ (h >> np.uint64(31))
+
+
+def _shuffle_keys(starts, seed, offset):
+    """Random sort key of every residue from the seed, the global index of its sequence and its position in it."""
+    n = starts[-1]
+    record = np.repeat(np.arange(len(starts) - 1), np.diff(starts))
+    within = np.arange(n) - starts[record]
+    seed_key = _mix(np.full(n, seed % 2 ** 64, dtype=np.uint64))
+    record_key = _mix(seed_key ^ (record + offset).astype(np.uint64))
+    return _mix(record_key ^ within.astype(np.uint64))
+
+
+def _split(residues, starts):
+    text = residues.tobytes().decode('ascii')
+    return [text[starts[i]:starts[i + 1]] for i in range(len(starts) - 1)]
+
+
+def _segments(residues, starts, cleavage, keep_cleavage):
+    """Return (segment id, segment start, last movable position of segment) for every residue."""
+    n = len(residues)
+    boundary = np.zeros(n, dtype=bool)
+    boundary[starts[:-1][starts[:-1] < n]] = True
+    is_cleavage = np.isin(residues, np.frombuffer(cleavage.encode('ascii'), dtype=np.uint8))
+    if keep_cleavage:
+        # a new segment starts after every cleavage residue
+        boundary[1:] |= is_cleavage[:-1]
+    segment = np.cumsum(boundary) - 1
+    segment_start = np.flatnonzero(boundary)
+    segment_end = np.append(segment_start[1:], n) - 1
+    movable_end = segment_end - (is_cleavage[segment_end] & keep_cleavage)
+    return segment, segment_start, movable_end
+
+
+def _decoy_chunk(sequences, strategy='reverse', seed=0, cleavage='KR', offset=0):
+    residues, starts = _concatenate(sequences)
+    if not len(residues):
+        return list(sequences)
+    segment, segment_start, movable_end = _segments(residues, starts, cleavage, strategy != 'reverse')
+    positions = np.arange(len(residues))
+    end = movable_end[segment]
+    movable = positions <= end
+
+    if strategy == 'shuffle':
+        moved = positions[movable]
+        order = np.lexsort((_shuffle_keys(starts, seed, offset)[movable], segment[movable]))
+        source = positions.copy()
+        source[moved] = moved[order]
+    else:
+        source = np.where(movable, segment_start[segment] + end - positions, positions)
+    return _split(residues[source], starts)
+
+
+def make_decoys(sequences, strategy='reverse', seed=0, workers=1, chunk_size=None, cleavage='KR', offset=0,
+                executor=None):
+    """
+    Return the decoy of every sequence.
+
+    Parameters:
+    - sequences: list of protein sequences
+    - strategy: one of STRATEGIES
+    - seed: seed for the shuffle strategy
+    - workers: number of processes the chunks are spread over
+    - chunk_size: sequences per chunk (default: one chunk per worker, at least MIN_CHUNK_SIZE sequences)
+    - cleavage: residues after which the enzyme cleaves (kept in place by pseudo_reverse and shuffle)
+    - offset: index of the first sequence in the whole input, so that a shuffle does not depend on
+      how the input is split into calls, chunks or workers
+    - executor: process pool of workers processes to use instead of starting one per call
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown decoy strategy '{strategy}', choose from {', '.join(STRATEGIES)}")
+    sequences = list(sequences)
+    if chunk_size is None:
+        chunk_size = max(-(-len(sequences) // max(workers, 1)), MIN_CHUNK_SIZE)
+    chunks = [sequences[i:i + chunk_size] for i in range(0, len(sequences), chunk_size)]
+    n = len(chunks)
+    args = (chunks, [strategy] * n, [seed] * n, [cleavage] * n, [offset + i * chunk_size for i in range(n)])
+    if workers <= 1 or n <= 1:
+        results = map(_decoy_chunk, *args)
+        return [decoy for result in results for decoy in result]
+    if executor is not None:
+        return [decoy for result in executor.map(_decoy_chunk, *args) for decoy in result]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return [decoy for result in executor.map(_decoy_chunk, *args) for decoy in result]
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+
+#Code to read large FASTA databases without Biopython.
+#The file is memory-mapped and records are located with bytes.find, so no SeqRecord objects are created.
+#  scan_headers - header lines only
+#  iter_fasta   - streaming (header, sequence) tuples
+#  build_index / FastaFile - samtools-style .fai index for random access by accession
+#  bgzip_file - block-gzip (BGZF) compression with a .gzi block index, readable by FastaFile and samtools faidx
+
+
+import os
+import gzip
+import mmap
+import zlib
+import struct
+from bisect import bisect_right
+from contextlib import contextmanager
+
+# uncompressed bytes per BGZF block (same as htslib)
+BGZF_BLOCK_SIZE = 65280
+BGZF_HEADER = struct.Struct('<4BI2BH2BHH')
+BGZF_EOF = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+
+
+def is_gzipped(path):
+    with open(path, 'rb') as fh:
+        return fh.read(2) == b'\x1f\x8b'
+
+
+@contextmanager
+def _mapped(path):
+    if is_gzipped(path):
+        # BGZF files are valid multi-member gzip files
+        with gzip.open(path, 'rb') as fh:
+            yield fh.read()
+        return
+    with open(path, 'rb') as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            yield b''
+            return
+        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mm
+        finally:
+            mm.close()
+
+
+def _records(mm):
+    """Yield (header_start, sequence_start, record_end) byte offsets of every record."""
+    pos = 0 if mm[:1] == b'>' else mm.find(b'\n>')
+    if pos == -1:
+        return
+    if pos:
+        pos += 1
+    size = len(mm)
+    while pos < size:
+        seq_start = mm.find(b'\n', pos)
+        seq_start = size if seq_start == -1 else seq_start + 1
+        end = mm.find(b'\n>', seq_start - 1)
+        end = size if end == -1 else end + 1
+        yield pos, seq_start, end
+        pos = end
+
+
+def _header(mm, start, seq_start):
+    return mm[start + 1:seq_start].rstrip(b'\r\n').decode()
+
+
+def accession(header):
+    """First word of a header (what Bio.SeqIO reports as record.id)."""
+    return header.split(None, 1)[0] if header else ''
+
+
+def scan_headers(path):
+    """Yield the header line (without '>') of every record."""
+    with _mapped(path) as mm:
+        for start, seq_start, _ in _records(mm):
+            yield _header(mm, start, seq_start)
+
+
+def iter_fasta(path):
+    """Yield (header, sequence) for every record."""
+    with _mapped(path) as mm:
+        for start, seq_start, end in _records(mm):
+            sequence = mm[seq_start:end].replace(b'\n', b'').replace(b'\r', b'')
+            yield _header(mm, start, seq_start), sequence.decode()
+
+
+def build_index(path, index_path=None):
+    """
+    Write a .fai index (name, length, offset, line bases, line width) next to the FASTA.
+
+    Returns the index as a dict of accession -> (length, offset, line bases, line width).
+    Like samtools faidx, all sequence lines of a record except the last must have the same length.
+    """
+    index_path = index_path or path + '.fai'
+    index = {}
+    with _mapped(path) as mm, open(index_path, 'w') as out:
+        for start, seq_start, end in _records(mm):
+            name = accession(_header(mm, start, seq_start))
+            lines = mm[seq_start:end].splitlines(keepends=True)
+            length = sum(len(line.rstrip(b'\r\n')) for line in lines)
+            line_bases = len(lines[0].rstrip(b'\r\n')) if lines else 0
+            line_width = len(lines[0]) if lines else 0
+            if any(len(line) != line_width for line in lines[:-1]):
+                raise ValueError(f"Different line length in sequence '{name}' of {path}")
+            if name in index:
+                # like samtools, the first record of a duplicated name is kept
+                continue
+            index[name] = (length, seq_start, line_bases, line_width)
+            out.write(f"{name}\t{length}\t{seq_start}\t{line_bases}\t{line_width}\n")
+    return index
+
+
+def load_index(index_path):
+    index = {}
+    with open(index_path) as fh:
+        for line in fh:
+            name, length, offset, line_bases, line_width = line.rstrip('\n').split('\t')[:5]
+            index[name] = (int(length), int(offset), int(line_bases), int(line_width))
+    return index
+
+
+class BgzfWriter:
+    """Write a BGZF file and remember the (compressed, uncompressed) offset of every block."""
+
+    def __init__(self, path, level=6):
+        self._fh = open(path, 'wb')
+        self.level = level
+        self._buffer = bytearray()
+        self.blocks = []
+        self._compressed_offset = 0
+        self._uncompressed_offset = 0
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= BGZF_BLOCK_SIZE:
+            self._write_block(bytes(self._buffer[:BGZF_BLOCK_SIZE]))
+            del self._buffer[:BGZF_BLOCK_SIZE]
+
+    def _write_block(self, data):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+        block_size = BGZF_HEADER.size + len(compressed) + 8
+        self._fh.write(BGZF_HEADER.pack(31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, block_size - 1))
+        self._fh.write(compressed)
+        self._fh.write(struct.pack('<II', zlib.crc32(data), len(data)))
+        self.blocks.append((self._compressed_offset, self._uncompressed_offset))
+        self._compressed_offset += block_size
+        self._uncompressed_offset += len(data)
+
+    def close(self):
+        if self._buffer:
+            self._write_block(bytes(self._buffer))
+            self._buffer.clear()
+        self._fh.write(BGZF_EOF)
+        self._fh.close()
+
+    def write_gzi(self, gzi_path):
+        # the first block (0, 0) is implicit in the .gzi format
+        entries = self.blocks[1:]
+        with open(gzi_path, 'wb') as fh:
+            fh.write(struct.pack('<Q', len(entries)))
+            for compressed_offset, uncompressed_offset in entries:
+                fh.write(struct.pack('<QQ', compressed_offset, uncompressed_offset))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def bgzip_file(path, bgzf_path, level=6, gzi_path=None, block_size=16 * 1024 * 1024):
+    """Compress a file to BGZF and write its .gzi block index."""
+    with open(path, 'rb') as fh, BgzfWriter(bgzf_path, level) as writer:
+        for block in iter(lambda: fh.read(block_size), b''):
+            writer.write(block)
+    writer.write_gzi(gzi_path or bgzf_path + '.gzi')
+
+
+def _read_block(fh, compressed_offset):
+    fh.seek(compressed_offset)
+    header = BGZF_HEADER.unpack(fh.read(BGZF_HEADER.size))
+    if header[:4] != (31, 139, 8, 4) or header[8:10] != (66, 67):
+        raise ValueError(f"Not a BGZF block at offset {compressed_offset}")
+    block_size = header[-1] + 1
+    compressed = fh.read(block_size - BGZF_HEADER.size - 8)
+    return zlib.decompress(compressed, -15), block_size
+
+
+def build_gzi(bgzf_path, gzi_path=None):
+    """Write the .gzi block index of an existing BGZF file by reading the block headers."""
+    blocks = []
+    compressed_offset = uncompressed_offset = 0
+    size = os.path.getsize(bgzf_path)
+    with open(bgzf_path, 'rb') as fh:
+        while compressed_offset < size:
+            data, block_size = _read_block(fh, compressed_offset)
+            if data:
+                blocks.append((compressed_offset, uncompressed_offset))
+            compressed_offset += block_size
+            uncompressed_offset += len(data)
+    with open(gzi_path or bgzf_path + '.gzi', 'wb') as fh:
+        fh.write(struct.pack('<Q', len(blocks[1:])))
+        for entry in blocks[1:]:
+            fh.write(struct.pack('<QQ', *entry))
+
+
+def load_gzi(gzi_path):
+    with open(gzi_path, 'rb') as fh:
+        count = struct.unpack('<Q', fh.read(8))[0]
+        values = struct.unpack(f"<{2 * count}Q", fh.read(16 * count))
+    return [(0, 0)] + list(zip(values[::2], values[1::2]))
+
+
+class _BgzfReader:
+    """Read uncompressed byte ranges of a BGZF file through its .gzi block index."""
+
+    def __init__(self, path, gzi_path):
+        self._fh = open(path, 'rb')
+        blocks = load_gzi(gzi_path)
+        self._compressed = [c for c, _ in blocks]
+        self._uncompressed = [u for _, u in blocks]
+
+    def read(self, offset, size):
+        i = bisect_right(self._uncompressed, offset) - 1
+        compressed_offset, skip = self._compressed[i], offset - self._uncompressed[i]
+        data = bytearray()
+        while len(data) < skip + size:
+            block, block_size = _read_block(self._fh, compressed_offset)
+            if not block:
+                break
+            data += block
+            compressed_offset += block_size
+        return bytes(data[skip:skip + size])
+
+    def close(self):
+        self._fh.close()
+
+
+class FastaFile:
+    """
+    Random access to the records of an indexed FASTA file, plain or BGZF compressed.
+
+    The .fai (and for BGZF the .gzi) index is built on first use if it is missing or older than the FASTA.
+    """
+
+    def __init__(self, path, index_path=None):
+        self.path = path
+        index_path = index_path or path + '.fai'
+        if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(path):
+            self.index = build_index(path, index_path)
+        else:
+            self.index = load_index(index_path)
+        self._fh = self._mm = self._bgzf = None
+        if is_gzipped(path):
+            gzi_path = path + '.gzi'
+            if not os.path.exists(gzi_path) or os.path.getmtime(gzi_path) < os.path.getmtime(path):
+                build_gzi(path, gzi_path)
+            self._bgzf = _BgzfReader(path, gzi_path)
+        else:
+            self._fh = open(path, 'rb')
+            self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b''
+
+    def _read(self, offset, size):
+        if self._bgzf:
+            return self._bgzf.read(offset, size)
+        return self._mm[offset:offset + size]
+
+    def fetch(self, name):
+        length, offset, line_bases, line_width = self.index[name]
+        if not length:
+            return ''
+        span = length + (length - 1) // line_bases * (line_width - line_bases)
+        return self._read(offset, span).replace(b'\n', b'').replace(b'\r', b'').decode()
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self):
+        if self._bgzf:
+            self._bgzf.close()
+            return
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
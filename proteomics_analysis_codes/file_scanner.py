@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+#Code to find files below one or more directory trees with their size and modification time.
+#Directories are listed with os.scandir by a thread pool, one directory per task, so deep and wide trees on
+#parallel filesystems are listed concurrently. The type of an entry comes from the directory listing and each
+#matching file is stat'ed once; directories and non-matching files are never stat'ed.
+#A precomputed listing (path, size, mtime per line) can be read instead of touching the filesystem.
+
+
+import os
+import time
+from fnmatch import fnmatchcase
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import pandas as pd
+
+LISTING_COLUMNS = ['path', 'size', 'mtime']
+
+
+def _scan_dir(path, pattern):
+    # one directory: matching files with (size, mtime) and the subdirectories to descend into
+    files, subdirs = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif fnmatchcase(entry.name, pattern) and entry.is_file():
+                    stat = entry.stat()
+                    files.append((entry.path, stat.st_size, stat.st_mtime))
+    except OSError as error:
+        print(f"Skipping {path}: {error}")
+    return files, subdirs
+
+
+def scan_files(roots, pattern='*.mzML', workers=8):
+    """
+    Return a DataFrame (path, size, mtime) of every file below the roots whose name matches pattern.
+
+    Parameters:
+    - roots: directory or list of directories
+    - pattern: shell-style pattern matched against file names (case-sensitive, like glob)
+    - workers: number of directories listed concurrently
+    """
+    roots = [roots] if isinstance(roots, str) else list(roots)
+    files = []
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        pending = {executor.submit(_scan_dir, root, pattern) for root in roots}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                found, subdirs = future.result()
+                files.extend(found)
+                pending.update(executor.submit(_scan_dir, subdir, pattern) for subdir in subdirs)
+    return pd.DataFrame(files, columns=LISTING_COLUMNS).sort_values('path', ignore_index=True)
+
+
+def read_listing(listing_file):
+    """
+    Read a precomputed listing: tab separated path, size and mtime per line (as written by write_listing).
+    Lines with only a path are accepted; their size and mtime are unknown and never filtered.
+    """
+    # no comment character: '#' is valid in a path
+    listing = pd.read_csv(listing_file, sep='\t', header=None, names=LISTING_COLUMNS,
+                          dtype={'path': str}, skip_blank_lines=True)
+    if len(listing) and listing['path'].iloc[0] == 'path':
+        listing = listing.iloc[1:]
+    listing['size'] = pd.to_numeric(listing['size'])
+    listing['mtime'] = pd.to_numeric(listing['mtime'])
+    return listing.reset_index(drop=True)
+
+
+def write_listing(files, listing_file):
+    files[LISTING_COLUMNS].to_csv(listing_file, sep='\t', header=False, index=False)
+
+
+def ready_files(files, min_age=60, now=None):
+    """
+    Drop empty files and files modified in the last min_age seconds (probably still being written).
+    Returns the kept files and the dropped ones.
+    """
+    now = time.time() if now is None else now
+    empty = files['size'] == 0
+    recent = files['mtime'] > now - min_age
+    dropped = empty | recent
+    return files[~dropped].reset_index(drop=True), files[dropped].reset_index(drop=True)
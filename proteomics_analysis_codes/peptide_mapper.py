@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+#Code to map identified peptides back to the proteins of the search database in a single pass.
+#An Aho-Corasick automaton is built once over all peptides and every protein sequence is scanned
+#exactly once, so the cost grows with the size of the proteome plus the number of hits instead of
+#(peptides x proteins). The C implementation from pyahocorasick is used when it is installed.
+
+
+from collections import deque
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+IL_TABLE = str.maketrans('I', 'L')
+
+
+class _Automaton:
+    """
+    Pure-python Aho-Corasick automaton with the same add_word/make_automaton/iter interface
+    as pyahocorasick.Automaton, used when the C extension is not available.
+    """
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.value = [None]
+        # nearest node on the fail chain (excluding itself) that ends a word
+        self.output_link = [0]
+
+    def add_word(self, word, value):
+        node = 0
+        for char in word:
+            nxt = self.goto[node].get(char)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.value.append(None)
+                self.output_link.append(0)
+                self.goto[node][char] = nxt
+            node = nxt
+        self.value[node] = value
+
+    def make_automaton(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                fail = self.goto[state].get(char, 0)
+                self.fail[child] = fail
+                self.output_link[child] = fail if self.value[fail] is not None else self.output_link[fail]
+                queue.append(child)
+
+    def iter(self, text):
+        goto, fail, value, output_link = self.goto, self.fail, self.value, self.output_link
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            hit = node if value[node] is not None else output_link[node]
+            while hit:
+                yield index, value[hit]
+                hit = output_link[hit]
+
+
+def build_automaton(words):
+    """Return an Aho-Corasick automaton whose iter(text) yields (end index, word) for every occurrence."""
+    automaton = ahocorasick.Automaton() if ahocorasick else _Automaton()
+    for word in words:
+        automaton.add_word(word, word)
+    if words:
+        automaton.make_automaton()
+    return automaton
+
+
+class PeptideMapper:
+    """
+    Multi-pattern index over a set of peptides.
+
+    Parameters:
+    - peptides: iterable of peptide sequences
+    - equate_il: treat isoleucine and leucine as the same residue. Peptides and proteins are
+      folded (I -> L) once, so the automaton is not duplicated for every I/L variant.
+    """
+
+    def __init__(self, peptides, equate_il=False):
+        self.equate_il = equate_il
+        # folded key -> original peptides sharing it
+        self.peptides = {}
+        for peptide in set(peptides):
+            self.peptides.setdefault(self._fold(peptide), []).append(peptide)
+
+        self.automaton = build_automaton(list(self.peptides))
+
+    def _fold(self, sequence):
+        return sequence.translate(IL_TABLE) if self.equate_il else sequence
+
+    def scan(self, sequence):
+        """Return the set of (folded) peptide keys found in a protein sequence."""
+        if not self.peptides:
+            return set()
+        return {key for _, key in self.automaton.iter(self._fold(sequence))}
+
+    def map_proteins(self, db):
+        """
+        Map every peptide to the proteins containing it.
+
+        Parameters:
+        - db: dict of protein header -> protein sequence
+
+        Returns a dict of peptide -> comma separated protein headers (in database order).
+        Peptides that are not found in any protein map to an empty string.
+        """
+        hits = {key: [] for key in self.peptides}
+        for header, sequence in db.items():
+            for key in self.scan(sequence):
+                hits[key].append(header)
+
+        prot_dict = {}
+        for key, proteins in hits.items():
+            joined = ', '.join(proteins)
+            for peptide in self.peptides[key]:
+                prot_dict[peptide] = joined
+        return prot_dict
+
+
+def get_mapped_proteins(peptides, db, equate_il=False):
+    """Return a dict of peptide -> comma separated protein headers containing the peptide."""
+    return PeptideMapper(peptides, equate_il=equate_il).map_proteins(db)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+#Code to parse the search database once and keep the result in an on-disk cache.
+#Each cache entry is keyed by the SHA1 and size of the FASTA file and holds
+#  sequences.bin  - all target sequences concatenated (memory-mapped on load)
+#  offsets.npy    - start offset of every sequence in sequences.bin
+#  meta.pkl       - protein headers and the Ensembl gene -> gene name mapping
+#  peptides_*.pkl - peptide -> mapped proteins results from earlier runs
+#Entries built from the same FASTA path with a different hash are evicted.
+
+
+import os
+import mmap
+import shutil
+import hashlib
+import pickle as pkl
+from collections.abc import Mapping
+import numpy as np
+from fasta_reader import iter_fasta, accession
+
+
+def read_protein_db(database_w_neoORFs):
+    """
+    Parse the search database.
+
+    Returns a dict of protein header -> sequence (decoys excluded) and a dict of
+    Ensembl gene ID -> gene name taken from the ENSP|ENST|ENSG|name headers.
+    """
+    db = {}
+    mapping_dict = {}
+    for header, seq in iter_fasta(database_w_neoORFs):
+        header = accession(header)
+        if not header.startswith('rev_'):
+            if header.startswith('ENSP'):
+                splits = header.split('|')
+                if len(splits) >= 4:
+                    mapping_dict[splits[2]] = splits[3]
+            db[header] = seq
+    return db, mapping_dict
+
+
+def file_key(path, block_size=1 << 20):
+    """Return '<sha1>_<size>' for a file."""
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(block_size), b''):
+            sha1.update(block)
+    return f"{sha1.hexdigest()}_{os.path.getsize(path)}"
+
+
+class CachedProteinDB(Mapping):
+    """Read-only header -> sequence mapping backed by a memory-mapped sequence file."""
+
+    def __init__(self, entry_dir, headers):
+        self.headers = headers
+        self.index = {header: i for i, header in enumerate(headers)}
+        self.offsets = np.load(os.path.join(entry_dir, 'offsets.npy'), mmap_mode='r')
+        with open(os.path.join(entry_dir, 'sequences.bin'), 'rb') as fh:
+            if os.fstat(fh.fileno()).st_size:
+                self.buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.buffer = b''
+
+    def _sequence(self, i):
+        return self.buffer[int(self.offsets[i]):int(self.offsets[i + 1])].decode('ascii')
+
+    def __getitem__(self, header):
+        return self._sequence(self.index[header])
+
+    def __iter__(self):
+        return iter(self.headers)
+
+    def __len__(self):
+        return len(self.headers)
+
+    def items(self):
+        for i, header in enumerate(self.headers):
+            yield header, self._sequence(i)
+
+
+def _entry_prefix(fasta_path):
+    return os.path.basename(fasta_path) + '.'
+
+
+def _write_entry(entry_dir, fasta_path, db, mapping_dict):
+    tmp_dir = f"{entry_dir}.tmp{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    offsets = np.zeros(len(db) + 1, dtype=np.int64)
+    with open(os.path.join(tmp_dir, 'sequences.bin'), 'wb') as fh:
+        for i, seq in enumerate(db.values()):
+            encoded = seq.encode('ascii')
+            fh.write(encoded)
+            offsets[i + 1] = offsets[i] + len(encoded)
+    np.save(os.path.join(tmp_dir, 'offsets.npy'), offsets)
+    with open(os.path.join(tmp_dir, 'meta.pkl'), 'wb') as fh:
+        pkl.dump({'source': os.path.abspath(fasta_path), 'headers': list(db), 'mapping_dict': mapping_dict},
+                 fh, protocol=pkl.HIGHEST_PROTOCOL)
+    try:
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        # another process finished the same entry first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _evict_stale(cache_dir, fasta_path, key):
+    prefix = _entry_prefix(fasta_path)
+    source = os.path.abspath(fasta_path)
+    for name in os.listdir(cache_dir):
+        if not name.startswith(prefix) or name == prefix + key:
+            continue
+        stale_dir = os.path.join(cache_dir, name)
+        try:
+            with open(os.path.join(stale_dir, 'meta.pkl'), 'rb') as fh:
+                stale_source = pkl.load(fh)['source']
+        except (OSError, EOFError, pkl.UnpicklingError, KeyError):
+            stale_source = source
+        if stale_source == source:
+            print(f"Evicting stale database cache {name}")
+            shutil.rmtree(stale_dir, ignore_errors=True)
+
+
+def load_protein_db(database_w_neoORFs, cache_dir=None):
+    """
+    Return (db, mapping_dict, entry_dir) for the search database.
+
+    Without a cache_dir the FASTA is parsed directly and entry_dir is None. Otherwise the
+    cached entry is loaded (and built first if the database is new or has changed).
+    """
+    if cache_dir is None:
+        db, mapping_dict = read_protein_db(database_w_neoORFs)
+        return db, mapping_dict, None
+
+    os.makedirs(cache_dir, exist_ok=True)
+    key = file_key(database_w_neoORFs)
+    entry_dir = os.path.join(cache_dir, _entry_prefix(database_w_neoORFs) + key)
+    _evict_stale(cache_dir, database_w_neoORFs, key)
+
+    if not os.path.exists(entry_dir):
+        print(f"Building database cache {entry_dir}")
+        db, mapping_dict = read_protein_db(database_w_neoORFs)
+        _write_entry(entry_dir, database_w_neoORFs, db, mapping_dict)
+
+    with open(os.path.join(entry_dir, 'meta.pkl'), 'rb') as fh:
+        meta = pkl.load(fh)
+    return CachedProteinDB(entry_dir, meta['headers']), meta['mapping_dict'], entry_dir
+
+
+def _peptide_index_path(entry_dir, equate_il):
+    return os.path.join(entry_dir, f"peptides_{'il' if equate_il else 'exact'}.pkl")
+
+
+def load_peptide_index(entry_dir, equate_il=False):
+    """Return the cached peptide -> mapped proteins dict for a cache entry."""
+    path = _peptide_index_path(entry_dir, equate_il)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'rb') as fh:
+        return pkl.load(fh)
+
+
+def save_peptide_index(entry_dir, prot_dict, equate_il=False):
+    """Merge newly mapped peptides into the cached peptide index of a cache entry."""
+    index = load_peptide_index(entry_dir, equate_il)
+    index.update(prot_dict)
+    path = _peptide_index_path(entry_dir, equate_il)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as fh:
+        pkl.dump(index, fh, protocol=pkl.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
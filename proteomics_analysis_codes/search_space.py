@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+
+#Code to digest a search database in silico and report the size of its peptide search space per source.
+#Sequences are concatenated into one numpy byte array per chunk; cleavage sites and peptides are found with
+#array arithmetic and every peptide is reduced to a 64-bit polynomial hash, so no peptide strings are built.
+#Unique peptides of a source are kept as a sorted uint64 array and compared with np.isin.
+#Sources (by accession):
+#  decoy       - rev_
+#  contaminant - sp
+#  neoORF      - taa / trans
+#  reference   - everything else
+
+
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from fasta_reader import iter_fasta, accession
+
+# residues cleaved after, and residues that block cleavage when they follow
+ENZYMES = {
+    'trypsin': ('KR', 'P'),
+    'trypsin/p': ('KR', ''),
+    'lys-c': ('K', 'P'),
+    'lys-n': ('K', ''),
+    'arg-c': ('R', 'P'),
+    'glu-c': ('E', 'P'),
+    'chymotrypsin': ('FWYL', 'P'),
+}
+SOURCES = ['reference', 'neoORF', 'contaminant', 'decoy']
+# proteins per chunk handed to a worker
+CHUNK_SIZE = 5000
+
+_BASE = np.uint64(0x100000001b3)
+# inverse of the (odd) base modulo 2**64, so a prefix hash can be shifted back to position 0
+_BASE_INV = np.uint64(pow(0x100000001b3, -1, 2 ** 64))
+
+
+def protein_source(name):
+    if name.startswith('rev_'):
+        return 'decoy'
+    if name.startswith('sp'):
+        return 'contaminant'
+    if name.startswith(('taa', 'trans')):
+        return 'neoORF'
+    return 'reference'
+
+
+def _mix(h):
+    # splitmix64 finalizer, spreads the polynomial hash over all 64 bits
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return h ^ (h >> np.uint64(31))
+
+
+def _powers(base, n):
+    powers = np.full(n, base, dtype=np.uint64)
+    powers[0] = 1
+    return np.cumprod(powers, dtype=np.uint64)
+
+
+def digest_hashes(sequences, enzyme='trypsin', missed_cleavages=2, min_length=7, max_length=50, equate_il=False):
+    """
+    Return (hash, protein index) of every peptide of the sequences within the length window.
+
+    Identical peptides get the same hash wherever they occur, so hashes of different chunks can be compared.
+    """
+    cleave, blocked = ENZYMES[enzyme]
+    lengths = np.fromiter((len(s) for s in sequences), dtype=np.int64, count=len(sequences))
+    starts = np.zeros(len(sequences) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=starts[1:])
+    text = ''.join(sequences).encode('ascii')
+    if equate_il:
+        text = text.replace(b'I', b'L')
+    residues = np.frombuffer(text, dtype=np.uint8)
+    n = len(residues)
+    if not n:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+
+    is_site = np.isin(residues, np.frombuffer(cleave.encode(), dtype=np.uint8))
+    if enzyme == 'lys-n':
+        # cleaves before the residue
+        ends = np.flatnonzero(is_site)
+    else:
+        if blocked:
+            is_site[:-1] &= ~np.isin(residues[1:], np.frombuffer(blocked.encode(), dtype=np.uint8))
+        ends = np.flatnonzero(is_site) + 1
+    sites = np.union1d(starts, ends)
+
+    # prefix[i] is the hash of residues[:i] with residue k weighted by base**k
+    powers = _powers(_BASE, n)
+    prefix = np.zeros(n + 1, dtype=np.uint64)
+    np.cumsum(residues.astype(np.uint64) * powers, out=prefix[1:])
+    inverse = _powers(_BASE_INV, n + 1)
+
+    start_protein = np.searchsorted(starts, sites, side='right') - 1
+    hashes, proteins = [], []
+    for missed in range(missed_cleavages + 1):
+        first, last = sites[:-missed - 1], sites[missed + 1:]
+        protein = start_protein[:-missed - 1]
+        length = last - first
+        # the peptide must end within the protein it starts in
+        keep = (last <= starts[protein + 1]) & (length >= min_length) & (length <= max_length)
+        first, last = first[keep], last[keep]
+        h = (prefix[last] - prefix[first]) * inverse[first]
+        hashes.append(_mix(h ^ length[keep].astype(np.uint64)))
+        proteins.append(protein[keep])
+    return np.concatenate(hashes), np.concatenate(proteins)
+
+
+def _digest_chunk(sources, sequences, options):
+    # worker: peptide counts and sorted unique hashes of every source in one chunk
+    hashes, proteins = digest_hashes(sequences, **options)
+    source_of = np.array([SOURCES.index(s) for s in sources], dtype=np.int8)[proteins]
+    result = {}
+    for i, source in enumerate(SOURCES):
+        selected = hashes[source_of == i]
+        result[source] = (len(selected), np.unique(selected))
+    return result
+
+
+def _chunks(database, chunk_size):
+    sources, sequences = [], []
+    for header, sequence in iter_fasta(database):
+        sources.append(protein_source(accession(header)))
+        sequences.append(sequence)
+        if len(sequences) == chunk_size:
+            yield sources, sequences
+            sources, sequences = [], []
+    if sequences:
+        yield sources, sequences
+
+
+def search_space(database, enzyme='trypsin', missed_cleavages=2, min_length=7, max_length=50, equate_il=False,
+                 workers=1, chunk_size=CHUNK_SIZE):
+    """
+    Digest every protein of the database and return per-source statistics.
+
+    Parameters:
+    - database: FASTA database, plain or gzip/BGZF compressed
+    - enzyme: one of ENZYMES
+    - missed_cleavages: maximum number of missed cleavages
+    - min_length, max_length: peptide length window
+    - equate_il: treat isoleucine and leucine as the same residue
+    - workers: number of processes the chunks are spread over
+    - chunk_size: proteins per chunk
+
+    Novel peptides of a source are the unique peptides that are not reference peptides.
+    """
+    if enzyme not in ENZYMES:
+        raise ValueError(f"Unknown enzyme '{enzyme}', choose from {', '.join(ENZYMES)}")
+    options = {'enzyme': enzyme, 'missed_cleavages': missed_cleavages, 'min_length': min_length,
+               'max_length': max_length, 'equate_il': equate_il}
+    proteins = dict.fromkeys(SOURCES, 0)
+    totals = dict.fromkeys(SOURCES, 0)
+    parts = {source: [] for source in SOURCES}
+
+    def collect(result):
+        for source, (total, unique) in result.items():
+            totals[source] += total
+            parts[source].append(unique)
+
+    if workers <= 1:
+        for sources, sequences in _chunks(database, chunk_size):
+            for source in sources:
+                proteins[source] += 1
+            collect(_digest_chunk(sources, sequences, options))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # at most two chunks per worker are in flight, so the database is never held in memory
+            pending = set()
+            for sources, sequences in _chunks(database, chunk_size):
+                for source in sources:
+                    proteins[source] += 1
+                pending.add(executor.submit(_digest_chunk, sources, sequences, options))
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future.result())
+            for future in pending:
+                collect(future.result())
+
+    unique = {source: np.unique(np.concatenate(parts[source])) if parts[source] else np.empty(0, dtype=np.uint64)
+              for source in SOURCES}
+    targets = np.unique(np.concatenate([unique[s] for s in SOURCES if s != 'decoy']))
+    stats = {'options': options, 'sources': {}}
+    for source in SOURCES:
+        stats['sources'][source] = {'proteins': proteins[source], 'peptides': totals[source],
+                                    'unique peptides': len(unique[source])}
+        if source != 'reference':
+            novel = ~np.isin(unique[source], unique['reference'], assume_unique=True)
+            stats['sources'][source]['novel peptides'] = int(novel.sum())
+    stats['unique target peptides'] = len(targets)
+    reference_size = len(unique['reference'])
+    stats['search space growth'] = round(len(targets) / reference_size - 1, 4) if reference_size else None
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Digests a search database in silico and reports total and novel peptides per source.")
+    parser.add_argument("--database", type=str, required=True, help="Path to the search database (e.g. the output of 1_create_database_for_searching.py).")
+    parser.add_argument("--enzyme", type=str, default='trypsin', choices=list(ENZYMES), help="Digestion enzyme.")
+    parser.add_argument("--missed_cleavages", type=int, default=2, help="Maximum number of missed cleavages.")
+    parser.add_argument("--min_length", type=int, default=7, help="Minimum peptide length.")
+    parser.add_argument("--max_length", type=int, default=50, help="Maximum peptide length.")
+    parser.add_argument("--equate_il", action="store_true", help="Treat isoleucine and leucine as the same residue.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used for digestion.")
+    parser.add_argument("--output", type=str, default=None, help="Path to write the statistics as JSON.")
+
+    args = parser.parse_args()
+    stats = search_space(args.database, args.enzyme, args.missed_cleavages, args.min_length, args.max_length,
+                         args.equate_il, args.workers)
+    for source, values in stats['sources'].items():
+        print(f"{source}: " + ', '.join(f"{key} {value}" for key, value in values.items()))
+    print(f"unique target peptides: {stats['unique target peptides']}")
+    print(f"search space growth: {stats['search space growth']}")
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(stats, fh, indent=2)
+        print(f"Statistics written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+#Code to record per-stage wall time, CPU time, peak memory and row counts of the analysis scripts.
+#On Linux the resident set high-water mark is reset at the start of every stage (/proc/self/clear_refs),
+#so peak_rss_mb is the peak of that stage; elsewhere it is the process peak so far.
+
+
+import os
+import sys
+import json
+import time
+import cProfile
+import resource
+from contextlib import contextmanager
+
+
+def _reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as fh:
+            fh.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    try:
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+
+def _children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class StageProfiler:
+    """
+    Collects one record per stage. A disabled profiler only yields an empty record so the
+    instrumentation can stay in place at no cost.
+
+    Parameters:
+    - enabled: record the stages
+    - profile_stages: names of stages to run under cProfile
+    - profile_dir: directory for the <stage>.prof cProfile dumps
+    """
+
+    def __init__(self, enabled=False, profile_stages=(), profile_dir='.'):
+        self.enabled = enabled
+        self.profile_stages = set(profile_stages)
+        self.profile_dir = profile_dir
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name, file_type=None):
+        record = {'stage': name}
+        if file_type is not None:
+            record['file_type'] = file_type
+        if not self.enabled and name not in self.profile_stages:
+            yield record
+            return
+
+        profiler = cProfile.Profile() if name in self.profile_stages else None
+        peak_reset = _reset_peak_rss()
+        wall, cpu, children_cpu = time.perf_counter(), time.process_time(), _children_cpu()
+        if profiler:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(os.path.join(self.profile_dir, f"{name}.prof"))
+            if self.enabled:
+                record['wall_s'] = round(time.perf_counter() - wall, 4)
+                record['cpu_s'] = round(time.process_time() - cpu, 4)
+                record['children_cpu_s'] = round(_children_cpu() - children_cpu, 4)
+                record['peak_rss_mb'] = round(_peak_rss_mb(), 1)
+                record['peak_rss_scope'] = 'stage' if peak_reset else 'process'
+                self.stages.append(record)
+                print(f"{name}{f' ({file_type})' if file_type else ''}: {record['wall_s']} s")
+
+    def run(self, name, func, *args, file_type=None, **kwargs):
+        """Run func(*args, **kwargs) as a stage and return its result."""
+        with self.stage(name, file_type) as record:
+            result = func(*args, **kwargs)
+            if hasattr(result, '__len__') and not isinstance(result, tuple):
+                record['rows'] = len(result)
+        return result
+
+    def report(self):
+        return {'stages': self.stages, 'total_wall_s': round(sum(s['wall_s'] for s in self.stages), 4),
+                'peak_rss_mb': round(max([s['peak_rss_mb'] for s in self.stages], default=0), 1)}
+
+    def write(self, path, **extra):
+        if not self.enabled:
+            return
+        with open(path, 'w') as fh:
+            json.dump({**extra, **self.report()}, fh, indent=2)
+        print(f"Profiling report written to {path}")
@@ -1,11 +1,8 @@
-<<<<<<< HEAD
-=======
 """
 Download datasets from the PRIDE url: https://www.ebi.ac.uk/pride/ws/archive/v3/webjars/swagger-ui/index.html#/projects/projects based on querying the /search/projects API
 Then upload them to the existing AWS S3 bucket (need to install boto3 to work between the local machine and the S3 bucket).
 """
 
->>>>>>> 9875bb40d42f6f5a541d7b86756af500b20d3efc
 import requests
 import json
 import os
@@ -15,16 +12,27 @@ import boto3
 import urllib.parse
 import urllib.request
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
 print("This is the merged version that includes both changes")
 
 class PrideDatasetManager:
-    def __init__(self, output_dir="./pride_data", s3_bucket=None):
+    def __init__(self, output_dir="./pride_data", s3_bucket=None, download_workers=4, connections_per_host=4,
+                 chunk_size=1024 * 1024):
         self.base_url = "https://www.ebi.ac.uk/pride/ws/archive/v3"
         self.output_dir = output_dir
         self.s3_bucket = s3_bucket
 
+        # Concurrent downloads: number of files in flight, open connections per host and bytes per read
+        self.download_workers = download_workers
+        self.connections_per_host = connections_per_host
+        self.chunk_size = chunk_size
+        self._host_slots = {}
+        self._host_lock = threading.Lock()
+        self._local = threading.local()
+
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
 
@@ -72,56 +80,94 @@ class PrideDatasetManager:
             print(f"Error getting files for dataset {accession}: {response.status_code}")
             return []
 
-    def download_file(self, url, output_path):
+    def _host_slot(self, url):
+        """Semaphore limiting the open connections to the host of a URL"""
+        host = urllib.parse.urlparse(url).netloc
+        with self._host_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.connections_per_host)
+            return self._host_slots[host]
+
+    def _session(self):
+        """One requests session (and connection pool) per download thread"""
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def download_file(self, url, output_path, progress=None):
         """
         Download a file from a URL to a specified path
+
+        The data is written to <output_path>.part and renamed when complete, so an interrupted download
+        is never taken for an existing file. With a shared progress bar the bytes are added to it,
+        otherwise the file gets its own bar.
         """
+        part_path = output_path + '.part'
         try:
-            if url.startswith('ftp://'):
-                # Handle FTP URLs using urllib
-                with urllib.request.urlopen(url) as response, open(output_path, 'wb') as out_file:
-                    total_size = int(response.headers.get('Content-Length', -1))
-                    
-                    with tqdm(
-                        desc=os.path.basename(output_path),
-                        total=total_size if total_size != -1 else None,
-                        unit='B',
-                        unit_scale=True,
-                        unit_divisor=1024,
-                    ) as pbar:
-                        while True:
-                            chunk = response.read(8192)
-                            if not chunk:
-                                break
-                            out_file.write(chunk)
-                            pbar.update(len(chunk))
-                return True
-            else:
-                # Use requests for HTTP/HTTPS
-                with requests.get(url, stream=True) as r:
-                    r.raise_for_status()
-                    total_size = int(r.headers.get('content-length', 0))
-
-                    with open(output_path, 'wb') as f, tqdm(
-                        desc=os.path.basename(output_path),
-                        total=total_size,
-                        unit='B',
-                        unit_scale=True,
-                        unit_divisor=1024,
-                    ) as pbar:
-                        for chunk in r.iter_content(chunk_size=8192):
-                            if chunk:  # filter out keep-alive chunks
-                                f.write(chunk)
-                                pbar.update(len(chunk))
-                return True
+            with self._host_slot(url):
+                if url.startswith('ftp://'):
+                    # Handle FTP URLs using urllib
+                    with urllib.request.urlopen(url) as response, open(part_path, 'wb') as out_file:
+                        total_size = int(response.headers.get('Content-Length', -1))
+                        chunks = iter(lambda: response.read(self.chunk_size), b'')
+                        self._write_chunks(chunks, out_file, output_path, total_size if total_size != -1 else None, progress)
+                else:
+                    # Use requests for HTTP/HTTPS
+                    with self._session().get(url, stream=True) as r:
+                        r.raise_for_status()
+                        total_size = int(r.headers.get('content-length', 0))
+                        with open(part_path, 'wb') as f:
+                            chunks = r.iter_content(chunk_size=self.chunk_size)
+                            self._write_chunks(chunks, f, output_path, total_size, progress)
+            os.replace(part_path, output_path)
+            return True
         except Exception as e:
-            print(f"Error downloading {url}: {str(e)}")
+            tqdm.write(f"Error downloading {url}: {str(e)}")
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            return False
+
+    def _write_chunks(self, chunks, out_file, output_path, total_size, progress=None):
+        if progress is not None:
+            for chunk in chunks:
+                if chunk:  # filter out keep-alive chunks
+                    out_file.write(chunk)
+                    progress.update(len(chunk))
+            return
+        with tqdm(
+            desc=os.path.basename(output_path),
+            total=total_size,
+            unit='B',
+            unit_scale=True,
+            unit_divisor=1024,
+        ) as pbar:
+            for chunk in chunks:
+                if chunk:  # filter out keep-alive chunks
+                    out_file.write(chunk)
+                    pbar.update(len(chunk))
+
+    def _download_and_upload(self, accession, file, file_url, output_path, progress=None):
+        """Download one file and upload it to S3 if a bucket is specified; runs in a download thread"""
+        if not self.download_file(file_url, output_path, progress):
             return False
 
+        # Upload to S3 if bucket is specified
+        if self.s3_bucket:
+            s3_key = f"data/{accession}/{file['fileName']}"
+            tqdm.write(f"Uploading to S3: {s3_key}")
+            try:
+                self.s3_client.upload_file(output_path, self.s3_bucket, s3_key)
+            except Exception as e:
+                tqdm.write(f"Error uploading to S3: {str(e)}")
+        return True
+
     def download_dataset(self, accession, max_files=None, file_types=None):
         """
         Download all files for a specific dataset
 
+        Files are downloaded by self.download_workers threads with at most self.connections_per_host
+        connections to one host; each file is uploaded to S3 by its thread right after its download.
+
         Parameters:
         - accession: PRIDE dataset accession ID
         - max_files: Maximum number of files to download (None for all)
@@ -147,8 +193,9 @@ class PrideDatasetManager:
         dataset_dir = os.path.join(self.output_dir, accession)
         os.makedirs(dataset_dir, exist_ok=True)
 
-        # Download each file
+        # Collect the files to download
         success_count = 0
+        downloads = []
         for file in files:
             file_url = file.get('publicFileLocations', [{}])[0].get('value', None)
             if not file_url:
@@ -163,18 +210,17 @@ class PrideDatasetManager:
                 success_count += 1
                 continue
 
-            print(f"Downloading {file['fileName']}...")
-            if self.download_file(file_url, output_path):
-                success_count += 1
+            downloads.append((file, file_url, output_path))
 
-                # Upload to S3 if bucket is specified
-                if self.s3_bucket:
-                    s3_key = f"data/{accession}/{file['fileName']}"
-                    print(f"Uploading to S3: {s3_key}")
-                    try:
-                        self.s3_client.upload_file(output_path, self.s3_bucket, s3_key)
-                    except Exception as e:
-                        print(f"Error uploading to S3: {str(e)}")
+        # Download concurrently with one progress bar over all files
+        if downloads:
+            sizes = [file.get('fileSizeBytes') for file, _, _ in downloads]
+            total_size = sum(sizes) if all(sizes) else None
+            print(f"Downloading {len(downloads)} files with {self.download_workers} workers...")
+            with tqdm(desc=accession, total=total_size, unit='B', unit_scale=True, unit_divisor=1024) as progress, \
+                    ThreadPoolExecutor(max_workers=max(self.download_workers, 1)) as executor:
+                results = executor.map(lambda d: self._download_and_upload(accession, *d, progress=progress), downloads)
+                success_count += sum(results)
 
         print(f"Downloaded {success_count} of {len(files)} files for dataset {accession}")
         return success_count > 0
@@ -361,10 +407,16 @@ def main():
     parser.add_argument('--filter', help='Filter string in the format field1==value1,field2==value2')
     parser.add_argument('--sort-direction', default='DESC', choices=['ASC', 'DESC'], help='Sort direction')
     parser.add_argument('--sort-fields', default='submissionDate', help='Fields to sort by')
+    parser.add_argument('--download-workers', type=int, default=4, help='Number of files downloaded concurrently')
+    parser.add_argument('--connections-per-host', type=int, default=4, help='Maximum concurrent connections to one host')
+    parser.add_argument('--chunk-size-mb', type=float, default=1, help='Size of the chunks downloads are read in (MB)')
 
     args = parser.parse_args()
 
-    manager = PrideDatasetManager(output_dir=args.output_dir, s3_bucket=args.s3_bucket)
+    manager = PrideDatasetManager(output_dir=args.output_dir, s3_bucket=args.s3_bucket,
+                                  download_workers=args.download_workers,
+                                  connections_per_host=args.connections_per_host,
+                                  chunk_size=int(args.chunk_size_mb * 1024 * 1024))
 
     # Search for datasets
     datasets = manager.search_datasets(
@@ -3,9 +3,51 @@
 
 import os
 import re
+import json
+import time
+import ctypes
+import select
+import hashlib
 import shutil
+import struct
+import threading
 from pathlib import Path
 import argparse
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+DATASET_PREFIXES = ('PXD', 'MSV')
+RAW_EXTENSIONS = ('.RAW', '.WIFF')
+# bytes copied per task when a file has to be copied to another filesystem
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+COPY_BUFFER_SIZE = 8 * 1024 * 1024
+# journal of planned and completed moves, kept in the root directory
+JOURNAL_FILE = '.organize_journal.jsonl'
+# the journal is fsynced after this many records or seconds, whichever comes first
+JOURNAL_SYNC_RECORDS = 1000
+JOURNAL_SYNC_SECONDS = 1.0
+# per-dataset checksum manifest (path relative to the dataset, size, mtime_ns, algorithm, checksum)
+CHECKSUM_FILE = 'checksums.tsv'
+
+# inotify event masks (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+INOTIFY_EVENT = struct.Struct('iIII')
+
+# The naming strategies of extract_sample_name as one anchored pattern. Alternatives are tried in order
+# at the start of the name, so the first strategy that matches wins, as with separate searches.
+SAMPLE_NAME_RULES = re.compile(r'^(?:(?P<rep>.*?)_Rep\d+|(?P<number>.*?)_\d+|(?P<last>.*?)\d+[^A-Za-z]*$)')
+DATE_PREFIX = re.compile(r'^\d+_(.+)$')
+TRAILING_SEPARATORS = re.compile(r'[^A-Za-z0-9]+$')
+
+def _strip_date(name):
+    # Remove date prefix if present
+    date_match = DATE_PREFIX.search(name)
+    return date_match.group(1) if date_match else name
 
 def extract_sample_name(filename):
     """
@@ -19,110 +61,635 @@ def extract_sample_name(filename):
     # Remove extension
     base_name = os.path.splitext(filename)[0]
 
-    # Strategy 1: Look for '_Rep\d+' pattern
-    match = re.search(r'^(.*?)_Rep\d+', base_name)
-    if match:
-        sample_name = match.group(1)
-        # Remove date prefix if present
-        date_match = re.search(r'^\d+_(.+)$', sample_name)
-        if date_match:
-            return date_match.group(1)
-        return sample_name
-
-    # Strategy 2: Look for '_\d+' pattern
-    match = re.search(r'^(.*?)_\d+', base_name)
+    match = SAMPLE_NAME_RULES.search(base_name)
     if match:
-        sample_name = match.group(1)
-        # Remove date prefix if present
-        date_match = re.search(r'^\d+_(.+)$', sample_name)
-        if date_match:
-            return date_match.group(1)
-        return sample_name
-
-    # Strategy 3: Look for the last digit sequence
-    match = re.search(r'^(.*?)\d+[^A-Za-z]*$', base_name)
-    if match and match.group(1):
-        # Remove trailing non-alphanumeric chars
-        sample_name = re.sub(r'[^A-Za-z0-9]+$', '', match.group(1))
-        # Remove date prefix if present
-        date_match = re.search(r'^\d+_(.+)$', sample_name)
-        if date_match:
-            return date_match.group(1)
-        return sample_name
-
-    # If no pattern found, check if there's a date prefix to remove
-    date_match = re.search(r'^\d+_(.+)$', base_name)
-    if date_match:
-        return date_match.group(1)
-
-    # Last resort: use the whole base name
-    return base_name
-
-def organize_samples(root_dir, dry_run=False):
-    """Organize raw data files into sample folders."""
+        if match.group('rep') is not None:
+            return _strip_date(match.group('rep'))
+        if match.group('number') is not None:
+            return _strip_date(match.group('number'))
+        if match.group('last'):
+            # Remove trailing non-alphanumeric chars
+            return _strip_date(TRAILING_SEPARATORS.sub('', match.group('last')))
+
+    # If no pattern found remove a date prefix, or as last resort use the whole base name
+    return _strip_date(base_name)
+
+def list_datasets(root_dir):
     # Get all directories starting with PXD or MSV
-    dataset_dirs = []
-    for item in os.listdir(root_dir):
-        item_path = os.path.join(root_dir, item)
-        if os.path.isdir(item_path) and (item.startswith('PXD') or item.startswith('MSV')):
-            dataset_dirs.append(item_path)
-
-    results = []
-    for dataset_dir in dataset_dirs:
-        dataset_name = os.path.basename(dataset_dir)
-        print(f"Processing dataset: {dataset_name}")
-
-        # Get all raw files in the dataset directory
-        raw_files = []
-        for file in os.listdir(dataset_dir):
-            if file.upper().endswith('.RAW') or file.upper().endswith('.WIFF'):
-                raw_files.append(file)
-
-        # Group files by sample names
-        samples = {}
-        for file in raw_files:
-            sample_name = extract_sample_name(file)
-            if sample_name not in samples:
-                samples[sample_name] = []
-            samples[sample_name].append(file)
-
-        # Create sample directories and move files
-        for sample_name, files in samples.items():
-            sample_dir_name = f"sample_{sample_name}"
-            sample_dir_path = os.path.join(dataset_dir, sample_dir_name)
-
-            if not os.path.exists(sample_dir_path) and not dry_run:
-                os.makedirs(sample_dir_path)
-
-            print(f"  Sample: {sample_name} - {len(files)} files")
-            for file in files:
-                src_path = os.path.join(dataset_dir, file)
-                dst_path = os.path.join(sample_dir_path, file)
-
-                if dry_run:
-                    print(f"    Would move: {file} to {sample_dir_name}/")
+    with os.scandir(root_dir) as entries:
+        return sorted(entry.path for entry in entries if entry.is_dir() and entry.name.startswith(DATASET_PREFIXES))
+
+def plan_dataset(dataset_dir, target_dir=None):
+    """Return the moves (dataset, sample, file, src, dst) that organize the raw files of one dataset."""
+    with os.scandir(dataset_dir) as entries:
+        raw_files = sorted(entry.name for entry in entries if entry.name.upper().endswith(RAW_EXTENSIONS))
+    return [make_move(dataset_dir, file, target_dir) for file in raw_files]
+
+def make_move(dataset_dir, file, target_dir=None):
+    sample_name = extract_sample_name(file)
+    return {'dataset': os.path.basename(dataset_dir), 'sample': sample_name, 'file': file,
+            'src': os.path.join(dataset_dir, file),
+            'dst': os.path.join(target_dir or dataset_dir, f"sample_{sample_name}", file)}
+
+def plan_moves(root_dir, target_root=None, workers=8, planned=None, finished=None):
+    """
+    Plan the moves of every dataset below root_dir; datasets are listed concurrently.
+
+    finished (name -> mtime_ns) and planned (name -> (mtime_ns, moves)) come from the journal. A dataset whose
+    directory mtime is unchanged since it finished is skipped, and one unchanged since it was planned reuses
+    that plan, both without listing it; any other dataset is scanned (e.g. after new files were downloaded).
+    Returns the moves and the directory mtime of every scanned dataset (name -> mtime_ns).
+    """
+    planned, finished = planned or {}, finished or {}
+    dataset_dirs = list_datasets(root_dir)
+    target_dirs = [os.path.join(target_root, os.path.basename(d)) if target_root else None for d in dataset_dirs]
+
+    def plan(dataset_dir, target_dir):
+        name = os.path.basename(dataset_dir)
+        mtime_ns = os.stat(dataset_dir).st_mtime_ns
+        if finished.get(name) == mtime_ns:
+            return name, None, []
+        if name in planned and planned[name][0] == mtime_ns:
+            return name, None, planned[name][1]
+        return name, mtime_ns, plan_dataset(dataset_dir, target_dir)
+
+    moves, scanned = [], {}
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        for name, mtime_ns, dataset_moves in executor.map(plan, dataset_dirs, target_dirs):
+            moves.extend(dataset_moves)
+            if mtime_ns is not None:
+                scanned[name] = mtime_ns
+    return moves, scanned
+
+class Journal:
+    """
+    Append-only JSONL journal of the organizer. Records are flushed and fsynced in batches
+    (JOURNAL_SYNC_RECORDS records or JOURNAL_SYNC_SECONDS seconds) and on sync() and close().
+
+    Paths (src, dst) are stored relative to the root directory, so the journal stays valid when the
+    root directory is given relative to another working directory.
+
+    Records:
+    - {"op": "plan", "dataset", "mtime_ns", "moves"}: the planned moves of a dataset and the mtime of its
+      directory when it was listed, replacing an earlier plan
+    - {"op": "plan_file", "dataset", "move"}: one move made in watch mode; it is kept for undo but is not
+      a plan of the dataset, so a later run still scans the dataset
+    - {"op": "done", "src"}: the move of src completed
+    - {"op": "undone", "src"}: the move of src was reverted
+    - {"op": "dataset_done", "dataset", "mtime_ns"}: every move of the dataset completed and no raw file was
+      left in it at the recorded directory mtime
+    """
+
+    def __init__(self, path, root_dir):
+        self.root_dir = root_dir
+        self._fh = open(path, 'a')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def write(self, record):
+        with self._lock:
+            self._fh.write(json.dumps(record) + '\n')
+            self._pending += 1
+            if self._pending >= JOURNAL_SYNC_RECORDS or time.monotonic() - self._last_sync >= JOURNAL_SYNC_SECONDS:
+                self._sync()
+
+    def relative(self, path):
+        return os.path.relpath(path, self.root_dir)
+
+    def write_plan(self, dataset, mtime_ns, moves):
+        self.write({'op': 'plan', 'dataset': dataset, 'mtime_ns': mtime_ns,
+                    'moves': [_relative_move(move, self.root_dir) for move in moves]})
+
+    def write_move(self, op, src):
+        self.write({'op': op, 'src': self.relative(src)})
+
+    def _sync(self):
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        self.sync()
+        self._fh.close()
+
+def _relative_move(move, root_dir):
+    return {**move, 'src': os.path.relpath(move['src'], root_dir), 'dst': os.path.relpath(move['dst'], root_dir)}
+
+def _resolve(path, root_dir):
+    return os.path.normpath(os.path.join(root_dir, path))
+
+def _absolute_move(move, root_dir):
+    return {**move, 'src': _resolve(move['src'], root_dir), 'dst': _resolve(move['dst'], root_dir)}
+
+def load_journal(journal_path, root_dir):
+    """
+    Return the planned moves per dataset (name -> (mtime_ns, moves)), the completed moves (by src, in completion
+    order) and the finished datasets (name -> mtime_ns). Journaled paths are resolved against root_dir (an absolute path).
+    Records written before mtimes were journaled have no mtime_ns, so their datasets are scanned again.
+    """
+    planned, done, finished = {}, {}, {}
+    moves = {}
+    if os.path.exists(journal_path):
+        with open(journal_path) as fh:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a record torn by a crash before it was synced
+                    continue
+                op = record['op']
+                if op == 'plan':
+                    plan = [_absolute_move(move, root_dir) for move in record['moves']]
+                    planned[record['dataset']] = (record.get('mtime_ns'), plan)
+                    moves.update((move['src'], move) for move in plan)
+                elif op == 'plan_file':
+                    move = _absolute_move(record['move'], root_dir)
+                    moves[move['src']] = move
+                elif op == 'done':
+                    src = _resolve(record['src'], root_dir)
+                    if src in moves:
+                        done.pop(src, None)
+                        done[src] = moves[src]
+                elif op == 'undone':
+                    move = done.pop(_resolve(record['src'], root_dir), None)
+                    if move:
+                        finished.pop(move['dataset'], None)
+                elif op == 'dataset_done':
+                    finished[record['dataset']] = record.get('mtime_ns')
+    return {'planned': planned, 'done': done, 'finished': finished}
+
+def copy_file_chunked(src, dst, executor, chunk_size=COPY_CHUNK_SIZE, digest=None, window=4):
+    """
+    Copy src to dst with the chunks of the file copied concurrently, then rename it into place.
+
+    With a digest (hashlib object) the copied chunks are also hashed, in file order; at most window chunks
+    are in flight so memory stays bounded.
+    """
+    size = os.path.getsize(src)
+    part_path = dst + '.part'
+    with open(src, 'rb') as fin, open(part_path, 'wb') as fout:
+        fout.truncate(size)
+
+        def copy_chunk(offset):
+            end = min(offset + chunk_size, size)
+            blocks = []
+            while offset < end:
+                data = os.pread(fin.fileno(), min(COPY_BUFFER_SIZE, end - offset), offset)
+                if not data:
+                    raise IOError(f"{src} changed size while copying")
+                os.pwrite(fout.fileno(), data, offset)
+                offset += len(data)
+                if digest:
+                    blocks.append(data)
+            return blocks
+
+        if digest:
+            in_flight = deque()
+            for offset in range(0, size, chunk_size):
+                in_flight.append(executor.submit(copy_chunk, offset))
+                if len(in_flight) >= window:
+                    for block in in_flight.popleft().result():
+                        digest.update(block)
+            while in_flight:
+                for block in in_flight.popleft().result():
+                    digest.update(block)
+        else:
+            list(executor.map(copy_chunk, range(0, size, chunk_size)))
+        os.fsync(fout.fileno())
+    shutil.copystat(src, part_path)
+    os.rename(part_path, dst)
+
+def move_file(src, dst, copy_executor, digest=None):
+    """
+    Atomic rename within a filesystem; across filesystems a parallel chunked copy followed by removal.
+    Returns True if the data was fed to digest on the way (only when it is copied).
+    """
+    if os.stat(src).st_dev == os.stat(os.path.dirname(dst)).st_dev:
+        os.rename(src, dst)
+        return False
+    if os.path.isdir(src):
+        # e.g. Waters .raw directories
+        shutil.move(src, dst)
+        return False
+    copy_file_chunked(src, dst, copy_executor, digest=digest)
+    os.remove(src)
+    return digest is not None
+
+def hash_file(path, digest, io_slots=None):
+    # large sequential reads; io_slots (a semaphore) bounds how many files are read at once
+    with io_slots or nullcontext(), open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(COPY_BUFFER_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def read_checksum_manifest(dataset_dir):
+    manifest = {}
+    path = os.path.join(dataset_dir, CHECKSUM_FILE)
+    if os.path.exists(path):
+        with open(path) as fh:
+            next(fh, None)
+            for line in fh:
+                file, size, mtime_ns, algorithm, checksum = line.rstrip('\n').split('\t')
+                manifest[file] = (int(size), int(mtime_ns), algorithm, checksum)
+    return manifest
+
+def update_checksum_manifest(dataset_dir, algorithm, known=None, executor=None, io_slots=None, verify=False):
+    """
+    Bring the checksum manifest of a dataset up to date with the files of its sample folders.
+
+    known (path -> checksum) holds files hashed while they were moved. Files whose size and mtime match the
+    manifest are not read again unless verify is set; new or changed files are hashed, and a changed
+    checksum is reported. Returns the number of files hashed here.
+    """
+    known = known or {}
+    manifest = read_checksum_manifest(dataset_dir)
+    entries, to_hash = {}, {}
+    with os.scandir(dataset_dir) as samples:
+        sample_dirs = sorted(entry.path for entry in samples if entry.is_dir() and entry.name.startswith('sample_'))
+    for sample_dir in sample_dirs:
+        with os.scandir(sample_dir) as entries_in_sample:
+            for entry in entries_in_sample:
+                if not entry.is_file() or entry.name.endswith('.part'):
+                    continue
+                file = os.path.relpath(entry.path, dataset_dir)
+                stat = entry.stat()
+                previous = manifest.get(file)
+                if entry.path in known:
+                    entries[file] = (stat.st_size, stat.st_mtime_ns, algorithm, known[entry.path])
+                elif not verify and previous and previous[:3] == (stat.st_size, stat.st_mtime_ns, algorithm):
+                    entries[file] = previous
                 else:
-                    print(f"    Moving: {file} to {sample_dir_name}/")
-                    shutil.move(src_path, dst_path)
+                    to_hash[file] = (entry.path, stat)
+
+    hashed = (executor.map if executor else map)(lambda path: hash_file(path, hashlib.new(algorithm), io_slots),
+                                                 [path for path, _ in to_hash.values()])
+    for (file, (_, stat)), checksum in zip(to_hash.items(), hashed):
+        previous = manifest.get(file)
+        if previous and previous[2] == algorithm and previous[3] != checksum:
+            print(f"    Checksum of {file} in {os.path.basename(dataset_dir)} changed")
+        entries[file] = (stat.st_size, stat.st_mtime_ns, algorithm, checksum)
+
+    tmp_path = os.path.join(dataset_dir, CHECKSUM_FILE + '.tmp')
+    with open(tmp_path, 'w') as fh:
+        fh.write('path\tsize\tmtime_ns\talgorithm\tchecksum\n')
+        for file in sorted(entries):
+            fh.write('\t'.join(map(str, (file,) + entries[file])) + '\n')
+    os.replace(tmp_path, os.path.join(dataset_dir, CHECKSUM_FILE))
+    return len(to_hash)
+
+def execute_moves(moves, workers=8, copy_workers=4, verbose=False, on_done=None, checksum=None, hash_workers=4):
+    """
+    Run the planned moves in a bounded thread pool. on_done(move) is called after every completed move.
+
+    With a checksum algorithm every moved file is hashed in the same pass: while it is copied across
+    filesystems, or read back after a rename with at most hash_workers files read at once.
+    The result is stored as move['checksum']. Returns the moves that failed with their error.
+    """
+    for sample_dir in sorted({os.path.dirname(move['dst']) for move in moves}):
+        os.makedirs(sample_dir, exist_ok=True)
+    io_slots = threading.BoundedSemaphore(max(hash_workers, 1))
+
+    def run(move):
+        try:
+            digest = hashlib.new(checksum) if checksum and not os.path.isdir(move['src']) else None
+            if not move_file(move['src'], move['dst'], copy_executor, digest) and digest:
+                hash_file(move['dst'], digest, io_slots)
+            if digest:
+                move['checksum'] = digest.hexdigest()
+        except OSError as error:
+            return move, error
+        if on_done:
+            on_done(move)
+        if verbose:
+            print(f"    Moved: {move['file']} to {os.path.basename(os.path.dirname(move['dst']))}/")
+        return None
+
+    with ThreadPoolExecutor(max_workers=max(copy_workers, 1)) as copy_executor, \
+            ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        failed = [result for result in executor.map(run, moves) if result]
+    for move, error in failed:
+        print(f"    Failed to move {move['src']}: {error}")
+    return failed
 
-            result = {
-                "dataset": dataset_name,
-                "sample": sample_name,
-                "files": files
-            }
-            results.append(result)
+def group_moves(moves):
+    # results in the form {"dataset", "sample", "files"}, in plan order
+    groups = {}
+    for move in moves:
+        groups.setdefault((move['dataset'], move['sample']), []).append(move['file'])
+    return [{"dataset": dataset, "sample": sample, "files": files} for (dataset, sample), files in groups.items()]
+
+def organize_samples(root_dir, dry_run=False, workers=8, copy_workers=4, target_root=None, verbose=False,
+                     journal_path=None, rescan=False, checksum=None, hash_workers=4, backfill_checksums=False,
+                     verify_checksums=False):
+    """
+    Organize raw data files into sample folders.
+
+    Planned and completed moves are recorded in a journal, so a rerun resumes the remaining moves and does not
+    list datasets that were planned or finished before, unless their directory changed since (one stat per dataset).
+    rescan ignores the journal and scans every dataset.
+    With a checksum algorithm (e.g. 'md5', 'sha256') moved files are hashed in the same pass and the
+    checksum manifests of the datasets organized in this run are brought up to date. backfill_checksums
+    extends this to every dataset (e.g. those organized before checksums were used), and verify_checksums
+    re-reads every file of the manifests updated instead of trusting unchanged size and mtime.
+    """
+    # the journal records paths relative to the root directory, all paths are absolute in memory
+    root_dir = os.path.abspath(root_dir)
+    target_root = os.path.abspath(target_root) if target_root else None
+    journal_path = journal_path or os.path.join(root_dir, JOURNAL_FILE)
+    state = load_journal(journal_path, root_dir) if not rescan else {'planned': {}, 'done': {}, 'finished': {}}
+    moves, scanned = plan_moves(root_dir, target_root, workers, state['planned'], state['finished'])
+    results = group_moves(moves)
+
+    dataset_name = None
+    for result in results:
+        if result["dataset"] != dataset_name:
+            dataset_name = result["dataset"]
+            print(f"Processing dataset: {dataset_name}")
+        print(f"  Sample: {result['sample']} - {len(result['files'])} files")
+        if dry_run:
+            for file in result["files"]:
+                print(f"    Would move: {file} to sample_{result['sample']}/")
+
+    if dry_run:
+        return results
+
+    journal = Journal(journal_path, root_dir)
+    try:
+        new_plans = {}
+        for move in moves:
+            if move['dataset'] in scanned:
+                new_plans.setdefault(move['dataset'], []).append(move)
+        for dataset, dataset_moves in new_plans.items():
+            journal.write_plan(dataset, scanned[dataset], dataset_moves)
+        journal.sync()
+
+        pending = []
+        for move in moves:
+            # done records only describe reused plans; a freshly scanned file has not been moved
+            if move['dataset'] not in scanned and move['src'] in state['done']:
+                continue
+            if not os.path.lexists(move['src']) and os.path.lexists(move['dst']):
+                # moved before a crash, but the record was not synced yet
+                journal.write_move('done', move['src'])
+                continue
+            pending.append(move)
+        if len(pending) < len(moves):
+            print(f"Resuming: {len(moves) - len(pending)} of {len(moves)} planned moves already done")
+
+        failed = execute_moves(pending, workers, copy_workers, verbose,
+                               on_done=lambda move: journal.write_move('done', move['src']),
+                               checksum=checksum, hash_workers=hash_workers)
+        if checksum:
+            dataset_dirs = dict.fromkeys(os.path.dirname(os.path.dirname(move['dst'])) for move in moves)
+            if backfill_checksums:
+                dataset_dirs.update(dict.fromkeys(os.path.join(target_root, os.path.basename(d)) if target_root else d
+                                                  for d in list_datasets(root_dir)))
+            update_checksum_manifests(list(dataset_dirs), checksum, pending, hash_workers, verify_checksums)
+        failed_datasets = {move['dataset'] for move, _ in failed}
+        for dataset in dict.fromkeys([*scanned, *(move['dataset'] for move in moves)]):
+            if dataset in failed_datasets:
+                continue
+            dataset_dir = os.path.join(root_dir, dataset)
+            # stat before listing: a file arriving later changes the mtime, one arriving earlier is listed
+            mtime_ns = os.stat(dataset_dir).st_mtime_ns
+            if not plan_dataset(dataset_dir):
+                journal.write({'op': 'dataset_done', 'dataset': dataset, 'mtime_ns': mtime_ns})
+    finally:
+        journal.close()
 
     return results
 
+def update_checksum_manifests(dataset_dirs, checksum, moves=(), hash_workers=4, verify=False):
+    known = {move['dst']: move['checksum'] for move in moves if 'checksum' in move}
+    io_slots = threading.BoundedSemaphore(max(hash_workers, 1))
+    with ThreadPoolExecutor(max_workers=max(hash_workers, 1)) as executor:
+        for dataset_dir in dataset_dirs:
+            if os.path.isdir(dataset_dir):
+                hashed = update_checksum_manifest(dataset_dir, checksum, known, executor, io_slots, verify)
+                if hashed:
+                    print(f"  {os.path.basename(dataset_dir)}: hashed {hashed} files already in sample folders")
+
+def undo_moves(root_dir, workers=8, copy_workers=4, verbose=False, journal_path=None, dry_run=False):
+    """
+    Move every completed file of the journal back, last moved first, and remove sample folders left empty.
+    With dry_run the reverse moves are only printed.
+    """
+    root_dir = os.path.abspath(root_dir)
+    journal_path = journal_path or os.path.join(root_dir, JOURNAL_FILE)
+    done = load_journal(journal_path, root_dir)['done']
+    reverse = [{**move, 'src': move['dst'], 'dst': move['src']} for move in reversed(list(done.values()))]
+    print(f"Undoing {len(reverse)} moves")
+    if dry_run:
+        for move in reverse:
+            print(f"    Would move: {os.path.relpath(move['src'], root_dir)} back to {os.path.relpath(move['dst'], root_dir)}")
+        return []
+
+    journal = Journal(journal_path, root_dir)
+    try:
+        # the record names the original source, so it matches the done record it reverts
+        failed = execute_moves(reverse, workers, copy_workers, verbose,
+                               on_done=lambda move: journal.write_move('undone', move['dst']))
+    finally:
+        journal.close()
+    for sample_dir in sorted({os.path.dirname(move['src']) for move in reverse}):
+        try:
+            os.rmdir(sample_dir)
+        except OSError:
+            pass
+    return failed
+
+class Inotify:
+    """Minimal inotify binding through ctypes (Linux only)."""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths = {}
+
+    def add_watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Cannot watch {path}")
+        self.paths[wd] = path
+
+    def read(self, timeout):
+        """Return the (watched path, mask, name) events of the next timeout seconds."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self.fd, 1 << 16)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b'\0')
+            events.append((self.paths.get(wd), mask, os.fsdecode(name)))
+            offset += INOTIFY_EVENT.size + length
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+def watch_samples(root_dir, target_root=None, interval=5, settle=30, poll=False, copy_workers=4, verbose=False,
+                  journal_path=None, dry_run=False):
+    """
+    Organize raw files as their downloads finish, until interrupted.
+
+    New raw files in the datasets (and new dataset directories) are noticed with inotify, or by listing the
+    dataset directories every interval seconds when inotify is unavailable or poll is set (e.g. on network
+    filesystems, where inotify does not see writes from other hosts). A file is moved once its size has not
+    changed between two checks and it was last modified more than settle seconds ago. Moves are journaled.
+    With dry_run ready files are only reported, once each, and nothing is moved or journaled.
+    """
+    root_dir = os.path.abspath(root_dir)
+    target_root = os.path.abspath(target_root) if target_root else None
+    journal_path = journal_path or os.path.join(root_dir, JOURNAL_FILE)
+    watcher = None
+    if not poll:
+        try:
+            watcher = Inotify()
+            watcher.add_watch(root_dir, IN_CREATE | IN_MOVED_TO)
+        except (OSError, AttributeError) as error:
+            print(f"inotify unavailable ({error}), polling every {interval} s")
+            watcher = None
+
+    # raw file -> (dataset directory, last observed (size, mtime))
+    pending = {}
+    datasets = set()
+
+    def scan_dataset(dataset_dir):
+        with os.scandir(dataset_dir) as entries:
+            for entry in entries:
+                if entry.name.upper().endswith(RAW_EXTENSIONS) and entry.is_file():
+                    pending.setdefault(entry.path, (dataset_dir, None))
+
+    def add_dataset(dataset_dir):
+        if dataset_dir not in datasets:
+            datasets.add(dataset_dir)
+            if watcher:
+                watcher.add_watch(dataset_dir, IN_CLOSE_WRITE | IN_MOVED_TO)
+            print(f"Watching dataset: {os.path.basename(dataset_dir)}")
+        scan_dataset(dataset_dir)
+
+    def rescan():
+        for dataset_dir in list_datasets(root_dir):
+            add_dataset(dataset_dir)
+
+    def ready_files():
+        ready = []
+        now = time.time()
+        for path, (dataset_dir, last) in list(pending.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del pending[path]
+                continue
+            current = (stat.st_size, stat.st_mtime)
+            if current == last and stat.st_size and now - stat.st_mtime >= settle:
+                del pending[path]
+                ready.append((dataset_dir, os.path.basename(path)))
+            else:
+                pending[path] = (dataset_dir, current)
+        return ready
+
+    journal = Journal(journal_path, root_dir) if not dry_run else None
+    reported = set()
+    rescan()
+    print(f"{'DRY RUN - ' if dry_run else ''}Watching {root_dir} ({'inotify' if watcher else 'polling'}), press Ctrl+C to stop")
+    try:
+        with ThreadPoolExecutor(max_workers=max(copy_workers, 1)) as copy_executor:
+            while True:
+                if watcher:
+                    for path, mask, name in watcher.read(interval):
+                        if mask & IN_Q_OVERFLOW:
+                            rescan()
+                        elif path == root_dir and mask & IN_ISDIR and name.startswith(DATASET_PREFIXES):
+                            add_dataset(os.path.join(root_dir, name))
+                        elif path in datasets and name.upper().endswith(RAW_EXTENSIONS) and not mask & IN_ISDIR:
+                            pending.setdefault(os.path.join(path, name), (path, None))
+                else:
+                    time.sleep(interval)
+                    rescan()
+
+                for dataset_dir, file in ready_files():
+                    target_dir = os.path.join(target_root, os.path.basename(dataset_dir)) if target_root else None
+                    move = make_move(dataset_dir, file, target_dir)
+                    if dry_run:
+                        if move['src'] not in reported:
+                            reported.add(move['src'])
+                            print(f"  {move['dataset']}: would move {file} to sample_{move['sample']}/")
+                        continue
+                    journal.write({'op': 'plan_file', 'dataset': move['dataset'], 'move': _relative_move(move, root_dir)})
+                    os.makedirs(os.path.dirname(move['dst']), exist_ok=True)
+                    try:
+                        move_file(move['src'], move['dst'], copy_executor)
+                    except OSError as error:
+                        print(f"    Failed to move {move['src']}: {error}")
+                        continue
+                    journal.write_move('done', move['src'])
+                    print(f"  {move['dataset']}: moved {file} to sample_{move['sample']}/")
+    except KeyboardInterrupt:
+        print("Stopped watching")
+    finally:
+        if journal:
+            journal.close()
+        if watcher:
+            watcher.close()
+
 def main():
     parser = argparse.ArgumentParser(description="Organize proteomics raw data files into sample groups")
     parser.add_argument("root_dir", help="Root directory containing PXD and MSV datasets")
     parser.add_argument("--dry-run", action="store_true", help="Print actions without executing them")
-    parser.add_argument("--verbose", action="store_true", help="Print detailed sample name extraction information")
+    parser.add_argument("--verbose", action="store_true", help="Print every file as it is moved")
+    parser.add_argument("--workers", type=int, default=8, help="Number of datasets scanned and files moved concurrently")
+    parser.add_argument("--copy-workers", type=int, default=4, help="Number of chunks copied concurrently when files move across filesystems")
+    parser.add_argument("--target-root", default=None, help="Create the sample folders under this directory instead of inside each dataset")
+    parser.add_argument("--journal", default=None, help=f"Journal of planned and completed moves (default: <root_dir>/{JOURNAL_FILE})")
+    parser.add_argument("--rescan", action="store_true", help="Scan every dataset again, including datasets the journal lists as planned or finished")
+    parser.add_argument("--undo", action="store_true", help="Move every file recorded in the journal back to where it came from")
+    parser.add_argument("--checksum", default=None, choices=['md5', 'sha1', 'sha256'], help=f"Hash files while they are organized and keep a {CHECKSUM_FILE} manifest per dataset")
+    parser.add_argument("--hash-workers", type=int, default=4, help="Number of files read concurrently for checksums")
+    parser.add_argument("--backfill-checksums", action="store_true", help="With --checksum, also update the manifests of datasets not organized in this run")
+    parser.add_argument("--verify-checksums", action="store_true", help="With --checksum, re-read every file of the manifests updated and report changed checksums")
+    parser.add_argument("--watch", action="store_true", help="Keep running and organize raw files as soon as their downloads finish")
+    parser.add_argument("--poll", action="store_true", help="In watch mode, list the datasets periodically instead of using inotify")
+    parser.add_argument("--interval", type=float, default=5, help="Seconds between checks in watch mode")
+    parser.add_argument("--settle", type=float, default=30, help="In watch mode, seconds a file must be unmodified before it is moved")
     args = parser.parse_args()
+    if (args.backfill_checksums or args.verify_checksums) and not args.checksum:
+        parser.error("--backfill-checksums and --verify-checksums need --checksum")
+
+    if args.watch:
+        # watch mode moves one file at a time as it is ready and does not hash files
+        options = {'--undo': args.undo, '--rescan': args.rescan, '--checksum': args.checksum,
+                   '--backfill-checksums': args.backfill_checksums, '--verify-checksums': args.verify_checksums,
+                   '--workers': args.workers != parser.get_default('workers'),
+                   '--hash-workers': args.hash_workers != parser.get_default('hash_workers')}
+        unsupported = [flag for flag, value in options.items() if value]
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} cannot be used with --watch")
+        watch_samples(args.root_dir, args.target_root, args.interval, args.settle, args.poll, args.copy_workers,
+                      args.verbose, args.journal, args.dry_run)
+        return
+
+    if args.undo:
+        print(f"{'DRY RUN - ' if args.dry_run else ''}Undoing the organization of {args.root_dir}")
+        undo_moves(args.root_dir, args.workers, args.copy_workers, args.verbose, args.journal, args.dry_run)
+        print("Done!")
+        return
 
     print(f"{'DRY RUN - ' if args.dry_run else ''}Organizing samples in {args.root_dir}")
-    organize_samples(args.root_dir, args.dry_run)
+    organize_samples(args.root_dir, args.dry_run, args.workers, args.copy_workers, args.target_root, args.verbose,
+                     args.journal, args.rescan, args.checksum, args.hash_workers, args.backfill_checksums,
+                     args.verify_checksums)
     print("Done!")
 
 if __name__ == "__main__":